@@ -11,7 +11,7 @@ from resch.graph import taskgraph
 from resch.scheduling import optimal, reft, schedule
 from test.fixtures import fixtures
 
-def single_benchmark(M, G, algo, benchmark, pbar = None):
+def single_benchmark(M, G, algo, benchmark, pbar = None, cache = None):
     """
     Benchmark one machine with a range of task graphs
 
@@ -19,15 +19,22 @@ def single_benchmark(M, G, algo, benchmark, pbar = None):
         M (): machine model
         Gs (): list of TaskGraph
         algo (): algorithm to be applied with algo(M, G)
+        cache (): optional dict to reuse schedules of equal (G, M, algo) runs
 
     Returns:
         Dictionary of metrics for the schedules
     """
 
-    start = time.time()
-    (S, E) = algo[1](M, G)
-    duration = time.time() - start
-    S.validate(G, M)
+    key = (G.fingerprint(), M.fingerprint(), algo[0])
+    if cache is not None and key in cache:
+        (S, E, duration) = cache[key]
+    else:
+        start = time.time()
+        (S, E) = algo[1](M, G)
+        duration = time.time() - start
+        S.validate(G, M, E)
+        if cache is not None:
+            cache[key] = (S, E, duration)
     (((S, E), G, algo[0], duration))
     if pbar:
         pbar.update(1)
@@ -52,7 +59,7 @@ def single_benchmark(M, G, algo, benchmark, pbar = None):
 
     return metrics
 
-def machine_benchmark(M, Gs, algos, benchmark, pbar = None):
+def machine_benchmark(M, Gs, algos, benchmark, pbar = None, cache = None):
     """
     Benchmark one machine with a range of task graphs
 
@@ -60,6 +67,7 @@ def machine_benchmark(M, Gs, algos, benchmark, pbar = None):
         M (): machine model
         Gs (): list of TaskGraph
         algo (): algorithm to be applied with algo(M, G)
+        cache (): optional dict shared with single_benchmark()
 
     Returns:
         Dictionary of metrics for the schedules
@@ -69,7 +77,7 @@ def machine_benchmark(M, Gs, algos, benchmark, pbar = None):
 
     for G in Gs:
         for algo in algos:
-            metrics.append(single_benchmark(M, G, algo, benchmark, pbar))
+            metrics.append(single_benchmark(M, G, algo, benchmark, pbar, cache))
 
     return metrics
 
@@ -87,8 +95,9 @@ def benchmark_random_optimal_reft(repetitions):
 
     pbar = tqdm(desc="random_optimal_reft", total = len(algos) * len(Ms) * len(Gs))
     dfs = []
+    cache = {}
     for (machine, M) in Ms:
-        dfs.extend(machine_benchmark(M, Gs, algos, {"generator": "random", "machine": machine}, pbar))
+        dfs.extend(machine_benchmark(M, Gs, algos, {"generator": "random", "machine": machine}, pbar, cache))
     return pd.concat(dfs)
 
 def benchmark_random_reconf(repetitions):
@@ -108,7 +117,7 @@ def benchmark_random_reconf(repetitions):
         types = [i % ntypes + 1 for i in range(len(M.PEs()))]
         random.shuffle(types)
         for i, pe in enumerate(M.PEs()):
-            pe.type = types[i]
+            M.properties[pe]["t"] = types[i]
 
     algos = [
             ("optimal", lambda M, G: optimal.OptimalScheduler(M, G, schedule.NoEdgeSchedule).schedule()),
@@ -117,11 +126,12 @@ def benchmark_random_reconf(repetitions):
     overheads = range(0, 200, 10)
     pbar = tqdm(desc="random_reconf", total = len(algos) * len(overheads) * len(Ms) * len(Gs))
     dfs = []
+    cache = {}
     for overhead in overheads:
         for (machine, M) in Ms:
             for loc in M.locations():
                 M.properties[loc]["r"] = overhead
-            dfs.extend(machine_benchmark(M, Gs, algos, {"machine": machine, "overhead": overhead}, pbar))
+            dfs.extend(machine_benchmark(M, Gs, algos, {"machine": machine, "overhead": overhead}, pbar, cache))
     return pd.concat(dfs)
 
 def benchmark_random_reconf_compare(repetitions):
@@ -143,7 +153,7 @@ def benchmark_random_reconf_compare(repetitions):
         types = [i % ntypes + 1 for i in range(len(M.PEs()))]
         random.shuffle(types)
         for i, pe in enumerate(M.PEs()):
-            pe.type = types[i]
+            M.properties[pe]["t"] = types[i]
 
     algos = [
             ("optimal", lambda M, G: optimal.OptimalScheduler(M, G, schedule.NoEdgeSchedule).schedule()),
@@ -152,11 +162,12 @@ def benchmark_random_reconf_compare(repetitions):
     overheads = range(0, 210, 10)
     pbar = tqdm(desc="random_reconf_compare", total = len(algos) * len(overheads) * len(Ms) * len(Gs))
     dfs = []
+    cache = {}
     for overhead in overheads:
         for (machine, M) in Ms:
             for loc in M.locations():
                 M.properties[loc]["r"] = overhead
-            dfs.extend(machine_benchmark(M, Gs, algos, {"machine": machine, "overhead": overhead}, pbar))
+            dfs.extend(machine_benchmark(M, Gs, algos, {"machine": machine, "overhead": overhead}, pbar, cache))
     return pd.concat(dfs)
 
 def benchmark_random_params(repetitions):
@@ -178,7 +189,7 @@ def benchmark_random_params(repetitions):
         types = [i % ntypes + 1 for i in range(len(M.PEs()))]
         random.shuffle(types)
         for i, pe in enumerate(M.PEs()):
-            pe.type = types[i]
+            M.properties[pe]["t"] = types[i]
 
     algos = [
             ("optimal", lambda M, G: optimal.OptimalScheduler(M, G, schedule.NoEdgeSchedule).schedule()),
@@ -188,13 +199,14 @@ def benchmark_random_params(repetitions):
     pbar = tqdm(desc="random_params", total = len(algos) * len(overheads) * len(Ms) * len(Gs))
 
     dfs = []
+    cache = {}
     for overhead in overheads:
         for (machine, M) in Ms:
             for loc in M.locations():
                 M.properties[loc]["r"] = overhead
             for G in Gs:
                 for algo in algos:
-                    dfs.append(single_benchmark(M, G, algo, {"machine": machine, "overhead": overhead} | G.parameters, pbar))
+                    dfs.append(single_benchmark(M, G, algo, {"machine": machine, "overhead": overhead} | G.parameters, pbar, cache))
     return pd.concat(dfs, ignore_index = True)
 def benchmark_random_communication(repetitions):
     Gs = ([taskgraph.TaskGraph(generator.erdos(i, 0.1 * p_i, None, lambda x, y: c), {"p": 0.1 * p_i, "c": c}) for i in range(10, 11) for p_i in range(9, 10) for c in range(0, 210, 10) for a in range(repetitions)])
@@ -213,7 +225,7 @@ def benchmark_random_communication(repetitions):
         types = [i % ntypes + 1 for i in range(len(M.PEs()))]
         random.shuffle(types)
         for i, pe in enumerate(M.PEs()):
-            pe.type = types[i]
+            M.properties[pe]["t"] = types[i]
 
     algos = [
             ("optimal", lambda M, G: optimal.OptimalScheduler(M, G, schedule.NoEdgeSchedule).schedule()),
@@ -224,10 +236,11 @@ def benchmark_random_communication(repetitions):
     pbar = tqdm(desc="random_communication", total = len(algos) * len(Ms) * len(Gs))
 
     dfs = []
+    cache = {}
     for (machine, M) in Ms:
         for G in Gs:
             for algo in algos:
-                dfs.append(single_benchmark(M, G, algo, {"machine": machine} | G.parameters, pbar))
+                dfs.append(single_benchmark(M, G, algo, {"machine": machine} | G.parameters, pbar, cache))
     return pd.concat(dfs, ignore_index = True)
 
 def benchmark_random_large(repetitions, max_size, max_types, max_pes, max_locations):
@@ -267,7 +280,7 @@ def benchmark_random_large(repetitions, max_size, max_types, max_pes, max_locati
         types = [i % ntypes + 1 for i in range(len(M.PEs()))]
         random.shuffle(types)
         for i, pe in enumerate(M.PEs()):
-            pe.type = types[i]
+            M.properties[pe]["t"] = types[i]
 
     algos = [
             ("REFT", lambda M, G: reft.REFT(M, G, schedule.NoEdgeSchedule).schedule()),
@@ -276,11 +289,12 @@ def benchmark_random_large(repetitions, max_size, max_types, max_pes, max_locati
     pbar = tqdm(desc="random_large", total = len(algos) * len(Ms) * len(Gs))
 
     dfs = []
+    cache = {}
     for (machine, M) in Ms:
         for G in Gs:
             for algo in algos:
                 if G.parameters["types"] <= len(M.PEs()):
-                    dfs.append(single_benchmark(M, G, algo, {"machine": machine} | G.parameters, pbar))
+                    dfs.append(single_benchmark(M, G, algo, {"machine": machine} | G.parameters, pbar, cache))
     return pd.concat(dfs, ignore_index = True)
 
 
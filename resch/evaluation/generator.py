@@ -1,7 +1,8 @@
-from graph_tool import Graph, GraphView, generation
+from graph_tool import Graph, generation
 from graph_tool.topology import min_spanning_tree
 from random import uniform, randrange
 from itertools import pairwise
+import numpy as np
 
 def erdos(n, p, cost_func = None, comcost_func = None, num_pes = 9):
     """
@@ -46,18 +47,22 @@ def layer_by_layer(n, layers, p, cost_func = None, comcost_func = None):
 
     g.vp["layer"] = g.new_vertex_property("int")
 
-    for _ in range(n):
-        v = g.add_vertex()
-        g.vp["layer"][v] = randrange(layers)
+    g.add_vertex(n)
+    g.vp["layer"].a = [randrange(layers) for _ in range(n)]
    
+    # Vertices of each layer in ascending order, drawing the edges in the
+    # same order as iterating over one filtered view per layer would
+    layer = g.vp["layer"].a
+    order = np.argsort(layer, kind="stable")
+    bounds = np.searchsorted(layer[order], np.arange(layers + 1))
+    members = [order[bounds[l]:bounds[l + 1]] for l in range(layers)]
+
+    edges = []
     for (layer_p, layer_n) in pairwise(range(layers)):
-        g_p = GraphView(g, vfilt=lambda v: g.vp["layer"][v] == layer_p)
-        g_n = GraphView(g, vfilt=lambda v: g.vp["layer"][v] == layer_n)
-
-        for v_p in g_p.get_vertices():
-            for v_n in g_n.get_vertices():
-                if uniform(0, 1) < p:
-                    g.add_edge(v_p, v_n)
+        for v_p in members[layer_p]:
+            edges.extend((v_p, v_n) for v_n in members[layer_n] if uniform(0, 1) < p)
+    if edges:
+        g.add_edge_list(edges)
 
     add_cost(g, cost_func, comcost_func)
     add_dummy_tasks(g)
@@ -175,22 +180,28 @@ def add_dummy_tasks(g):
 
     Add an empty entry and exit task
 
+    The entry task precedes all tasks without dependencies and the exit task
+    succeeds all tasks without dependents.
+
     Args:
         g (): graph to change
     """
+    vertices = g.get_vertices()
+    sources = vertices[g.get_in_degrees(vertices) == 0]
+    sinks = vertices[g.get_out_degrees(vertices) == 0]
+
     entry_task = g.add_vertex()
     exit_task = g.add_vertex()
     if "cost" in g.vp:
         g.vp.cost[entry_task] = [0] * 9
         g.vp.cost[exit_task] = [0] * 9
-    for v in g.vertices():
-        if v != entry_task and v != exit_task:
-            entry_edge = g.add_edge(entry_task, v)
-            exit_edge = g.add_edge(v, exit_task)
-
-            if "comm" in g.ep:
-                g.ep.comm[entry_edge] = 0
-                g.ep.comm[exit_edge] = 0
+
+    edges = [g.add_edge(entry_task, v) for v in sources]
+    edges.extend(g.add_edge(v, exit_task) for v in sinks)
+
+    if "comm" in g.ep:
+        for e in edges:
+            g.ep.comm[e] = 0
 
 def add_cost(g, cost_func = None, comcost_func = None, num_PEs = 9):
     """
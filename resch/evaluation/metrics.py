@@ -25,7 +25,8 @@ def slr(S, G):
     s : Schedule
     G : TaskGraph
     """
-    return makespan(S) / sum(G.min_p(v)[1] for (v, e) in G.cp())
+    path = G.critical_path().path
+    return makespan(S) / G.w[path].min(axis=1).sum()
 
 def slack(S, G):
     """ Calculate the slack
@@ -39,7 +40,7 @@ def slack(S, G):
         
     """
     slen = makespan(S)
-    return sum(slen - G.rank_u(v) - G.rank_d(v) for v in G.nodes()) / G.num_nodes()
+    return (slen - G.cp_len() + G.slack()).sum() / G.num_nodes()
 
 def efficiency_r(S, G, m, c, r):
     s = speedup(S, G)
@@ -0,0 +1,276 @@
+import numpy as np
+import os
+import pandas as pd
+import time
+import tracemalloc
+from graph_tool import Graph
+
+from resch.evaluation import generator
+from resch.graph import taskgraph
+from resch.scheduling import lns, optimal, reft, schedule
+from test.fixtures import fixtures
+
+def synthetic(n, degree = 3, num_pes = 9, ntypes = 4, seed = 0):
+    """
+
+    Create a random DAG with cost, type and comm property maps in bulk
+
+    Args:
+        n (): number of tasks
+        degree (): average out degree
+        num_pes (): length of the cost vector of each task
+        ntypes (): number of task types
+
+    Returns:
+        Graph
+    """
+    rng = np.random.default_rng(seed)
+    src = rng.integers(0, n - 1, size=n * degree)
+    dst = src + 1 + (rng.random(n * degree) * (n - 1 - src)).astype(int)
+
+    g = Graph()
+    g.add_vertex(n)
+    g.add_edge_list(np.unique(np.column_stack((src, dst)), axis=0))
+
+    g.vp["cost"] = g.new_vertex_property("vector<int>")
+    g.vp["cost"].set_2d_array(rng.integers(1, 100, size=(num_pes, n)))
+    g.vp["type"] = g.new_vertex_property("int")
+    g.vp["type"].a = rng.integers(1, ntypes + 1, size=n)
+    g.ep["comm"] = g.new_edge_property("int")
+    g.ep["comm"].a = rng.integers(0, 100, size=g.num_edges())
+    return g
+
+def measure(func, repetitions):
+    """ Best wall time of func over a number of repetitions """
+    best = float("inf")
+    for _ in range(repetitions):
+        start = time.time()
+        func()
+        best = min(best, time.time() - start)
+    return best
+
+def benchmark_ingestion(sizes = (1000, 10000, 100000), repetitions = 3):
+    """
+
+    Compare the bulk TaskGraph ingestion with the element-wise one
+
+    Args:
+        sizes (): number of tasks of each graph
+        repetitions (): runs per measurement, the best one is kept
+
+    Returns:
+        DataFrame with one row per graph size
+    """
+    rows = []
+    for n in sizes:
+        g = synthetic(n)
+        bulk = measure(lambda: taskgraph.TaskGraph.from_graph(g), repetitions)
+        iterative = measure(lambda: taskgraph.TaskGraph.from_graph_iter(g), repetitions)
+        rows.append([n, g.num_edges(), iterative, bulk, iterative / bulk])
+
+    return pd.DataFrame(rows, columns=["num_nodes", "num_edges", "iterative", "bulk", "speedup"])
+
+def traced(func, files):
+    """
+
+    Memory that func allocates from lines in files and that is still alive
+    when it returns
+
+    tracemalloc charges an object to the line that creates it, not to the
+    module of its class, so files has to name the callers.
+
+    Returns:
+        (result of func, bytes, blocks, peak bytes of the whole run)
+    """
+    tracemalloc.start()
+    result = func()
+    snapshot = tracemalloc.take_snapshot()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = snapshot.filter_traces([tracemalloc.Filter(True, f) for f in files]).statistics("filename")
+    return (result, sum(stat.size for stat in stats), sum(stat.count for stat in stats), peak)
+
+def benchmark_task_allocations(n = 10000):
+    """
+
+    Memory allocated for tasks during a REFT run, compared to creating a Task
+    on every access
+
+    Tasks are created once per TaskGraph, in taskgraph.py, and REFT adds one
+    ScheduledTask and Instance per node, in reft.py. Before, every call of
+    task(), tasks(), task_dependencies() and sorted_by_urank() built new Task
+    objects. REFT accesses every task once in sorted_by_urank() and once per
+    out-edge in task_dependencies(). The per-call variant creates that many
+    dict-backed Tasks and keeps them alive, so the traced memory is what was
+    allocated in total.
+
+    Args:
+        n (): number of tasks
+
+    Returns:
+        DataFrame with one row per metric
+    """
+    class DictTask:
+        def __init__(self, index, label, cost, ttype = None):
+            self.index = index
+            self.label = label
+            self.cost = cost
+            self.type = ttype
+
+    G = taskgraph.TaskGraph(synthetic(n))
+    M = fixtures.single_config_machine(num_PEs = 3, num_locs = 2)
+
+    start = time.time()
+    (_, cached_bytes, cached_blocks, peak) = traced(lambda: reft.REFT(M, G).schedule(), [taskgraph.__file__, reft.__file__])
+    duration = time.time() - start
+
+    def per_call():
+        accessed = list(range(n)) + list(G.c.edges()[1])
+        return [DictTask(v, f"Task {v}", G.w[v]) for v in accessed]
+    (accessed, per_call_bytes, per_call_blocks, _) = traced(per_call, [__file__])
+
+    return pd.DataFrame([
+        ["runtime", duration],
+        ["peak_bytes", peak],
+        ["cached_task_bytes", cached_bytes],
+        ["cached_task_blocks", cached_blocks],
+        ["cached_task_blocks_per_node", cached_blocks / n],
+        ["task_accesses", len(accessed)],
+        ["per_call_task_bytes", per_call_bytes],
+        ["per_call_task_blocks", per_call_blocks],
+        ["reduction", 1 - cached_bytes / per_call_bytes]],
+        columns=["metric", "value"])
+
+
+def benchmark_edge_schedule(blocks = (10, 12, 14), repetitions = 1):
+    """
+
+    REFT runtime with and without scheduling the links on LU task graphs
+
+    Args:
+        blocks (): number of blocks of each LU decomposition
+        repetitions (): runs per measurement, the best one is kept
+
+    Returns:
+        DataFrame with one row per graph and edge schedule
+    """
+    M = fixtures.single_config_machine(num_PEs = 4, num_locs = 2)
+    rows = []
+    for num_blocks in blocks:
+        G = taskgraph.TaskGraph(generator.lu(num_blocks))
+        for E_cls in [schedule.NoEdgeSchedule, schedule.EdgeSchedule]:
+            runtime = measure(lambda: reft.REFT(M, G, E_cls).schedule(), repetitions)
+            (S, _) = reft.REFT(M, G, E_cls).schedule()
+            rows.append([num_blocks, G.num_nodes(), G.num_edges(), E_cls.__name__, runtime, S.length()])
+
+    return pd.DataFrame(rows, columns=["blocks", "num_nodes", "num_edges", "edge_schedule", "runtime", "makespan"])
+
+
+def benchmark_reft_scaling(sizes = (1000, 10000, 100000), width = 10, degree = 3):
+    """
+
+    REFT runtime on layer-by-layer graphs of growing size
+
+    The layers have a constant expected width and out degree, so the number of
+    edges grows linearly with the number of tasks and so should the runtime.
+
+    Args:
+        sizes (): number of tasks of each graph
+        width (): expected number of tasks per layer
+        degree (): expected out degree of a task
+
+    Returns:
+        DataFrame with one row per graph size
+    """
+    M = fixtures.single_config_machine(num_PEs = 4, num_locs = 2)
+    rows = []
+    for n in sizes:
+        G = taskgraph.TaskGraph(generator.layer_by_layer(n, n // width, degree / width))
+        start = time.time()
+        reft.REFT(M, G).schedule()
+        runtime = time.time() - start
+        rows.append([n, G.num_edges(), runtime, runtime / G.num_edges() * 1e6])
+
+    return pd.DataFrame(rows, columns=["num_nodes", "num_edges", "runtime", "us_per_edge"])
+
+
+def benchmark_optimal_reconfiguration(sizes = (5, 10, 20), overhead = 2):
+    """
+
+    Model size, build and solve time of the reconfiguration formulations of
+    the optimal scheduler
+
+    Both formulations are exact, "instances" orders every pair of placed
+    instances and "tasks" every pair of tasks.
+
+    Args:
+        sizes (): number of tasks of each graph
+        overhead (): reconfiguration overhead r of every location
+
+    Returns:
+        DataFrame with one row per machine, graph and formulation
+    """
+    machines = {
+        "pr_2x2": fixtures.pr_machine(2, 2),
+        "r_1-2x2": fixtures.r_machine([1, 2], 2),
+        "r_2-2x3": fixtures.r_machine([2, 2], 3),
+    }
+    rows = []
+    for name, M in machines.items():
+        for l in M.locations():
+            M.properties[l]["r"] = overhead
+        for n in sizes:
+            G = taskgraph.TaskGraph(generator.random(n))
+            for formulation in ["instances", "tasks"]:
+                scheduler = optimal.OptimalScheduler(M, G, reconfiguration = formulation)
+                (S, _) = scheduler.schedule(time_limit = 60)
+                proto = scheduler.model.Proto()
+                rows.append([name, n, formulation, len(proto.variables), len(proto.constraints), scheduler.build_time, scheduler.solve_time, S.length()])
+
+    return pd.DataFrame(rows, columns=["machine", "num_nodes", "formulation", "variables", "constraints", "build_time", "solve_time", "makespan"])
+
+
+def benchmark_lns(blocks = (10, 14), time_limit = 60, overhead = 10):
+    """
+
+    Makespan of the LNS scheduler over time on LU task graphs, starting from
+    REFT
+
+    Args:
+        blocks (): number of blocks of each LU decomposition
+        time_limit (): budget of each run in seconds
+        overhead (): reconfiguration overhead r of every location
+
+    Returns:
+        DataFrame with one row per improvement and graph
+    """
+    M = fixtures.pr_machine(num_PEs = 4, num_locs = 2)
+    for l in M.locations():
+        M.properties[l]["r"] = overhead
+    rows = []
+    for num_blocks in blocks:
+        G = taskgraph.TaskGraph(generator.lu(num_blocks))
+        scheduler = lns.LNS(M, G)
+        scheduler.schedule(time_limit = time_limit)
+        reft_makespan = scheduler.history[0].makespan
+        for step in scheduler.history:
+            rows.append([num_blocks, G.num_nodes(), step.wall, step.iteration, step.makespan, 1 - step.makespan / reft_makespan])
+
+    return pd.DataFrame(rows, columns=["blocks", "num_nodes", "wall", "iteration", "makespan", "improvement"])
+
+
+if __name__ == "__main__":
+    os.makedirs("benchmarks", exist_ok=True)
+    with open("benchmarks/ingestion.csv", "w") as f:
+        benchmark_ingestion().to_csv(f, index=False)
+    with open("benchmarks/task_allocations.csv", "w") as f:
+        benchmark_task_allocations().to_csv(f, index=False)
+    with open("benchmarks/edge_schedule.csv", "w") as f:
+        benchmark_edge_schedule().to_csv(f, index=False)
+    with open("benchmarks/reft_scaling.csv", "w") as f:
+        benchmark_reft_scaling().to_csv(f, index=False)
+    with open("benchmarks/optimal_reconfiguration.csv", "w") as f:
+        benchmark_optimal_reconfiguration().to_csv(f, index=False)
+    with open("benchmarks/lns.csv", "w") as f:
+        benchmark_lns().to_csv(f, index=False)
@@ -1,2 +1,3 @@
 from .util import load, save
 from .taskgraph import *
+from .sparse import *
@@ -0,0 +1,103 @@
+import numpy as np
+
+class EdgeCosts:
+    """ Communication cost per edge, stored in compressed sparse rows
+
+        Only the edges of the task graph are stored, so memory grows with the
+        number of edges instead of the number of tasks squared. Entries (f, t)
+        that are not an edge read as 0, just like in a dense matrix.
+    """
+
+    def __init__(self, num_nodes, src = (), dst = (), data = ()):
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        data = np.asarray(data)
+
+        # Sort by (src, dst), keep the last cost written for duplicate edges
+        order = np.lexsort((dst, src))
+        src, dst, data = src[order], dst[order], data[order]
+        last = np.ones(len(src), dtype=bool)
+        last[:-1] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+        src, dst, data = src[last], dst[last], data[last]
+
+        self.num_nodes = num_nodes
+        self.indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_nodes), out=self.indptr[1:])
+        self.indices = dst
+        self.data = data
+
+    @property
+    def shape(self):
+        return (self.num_nodes, self.num_nodes)
+
+    @property
+    def nnz(self):
+        """ Number of stored edges """
+        return len(self.data)
+
+    def position(self, f, t):
+        """ Index of edge (f, t) in data or -1 if there is no such edge """
+        lower = self.indptr[f]
+        upper = self.indptr[f + 1]
+        pos = lower + np.searchsorted(self.indices[lower:upper], t)
+        if pos < upper and self.indices[pos] == t:
+            return pos
+        return -1
+
+    def lookup(self, src, dst):
+        """ Costs of many (src, dst) pairs at once, 0 where there is no edge """
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        costs = np.zeros(len(src), dtype=self.data.dtype)
+        if self.nnz == 0:
+            return costs
+
+        # CSR order is sorted by (src, dst), so the flat keys are sorted as well
+        keys = self.sources() * self.num_nodes + self.indices
+        wanted = src * self.num_nodes + dst
+        pos = np.searchsorted(keys, wanted).clip(max=self.nnz - 1)
+        found = keys[pos] == wanted
+        costs[found] = self.data[pos[found]]
+        return costs
+
+    def __contains__(self, key):
+        return self.position(*key) >= 0
+
+    def __getitem__(self, key):
+        pos = self.position(*key)
+        if pos < 0:
+            return self.data.dtype.type(0)
+        return self.data[pos]
+
+    def __setitem__(self, key, value):
+        pos = self.position(*key)
+        if pos < 0:
+            raise KeyError(f"{key} is not an edge")
+        self.data[pos] = value
+
+    def row(self, f):
+        """ Targets and costs of all out-edges of f """
+        lower = self.indptr[f]
+        upper = self.indptr[f + 1]
+        return (self.indices[lower:upper], self.data[lower:upper])
+
+    def sources(self):
+        """ Source of each stored edge, aligned with indices and data """
+        return np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+
+    def edges(self):
+        """ All edges as (src, dst, cost) arrays """
+        return (self.sources(), self.indices, self.data)
+
+    def transpose(self):
+        """ Same costs indexed by target, i.e. rows hold the in-edges """
+        src, dst, data = self.edges()
+        return EdgeCosts(self.num_nodes, dst, src, data)
+
+    def fill(self, value):
+        self.data[:] = value
+
+    def toarray(self):
+        dense = np.zeros(self.shape)
+        dense[self.sources(), self.indices] = self.data
+        return dense
@@ -1,13 +1,31 @@
+import hashlib
 import numpy as np
 import pdb
+from collections import namedtuple
+from itertools import pairwise
 from math import sqrt
-from graph_tool.topology import topological_sort, shortest_path
-from functools import cache
+from graph_tool import Graph
+from graph_tool.topology import topological_sort
 from resch.scheduling import task
+from resch.graph.sparse import EdgeCosts
+
+# length: cost of the longest path, path: its nodes from entry to exit,
+# tasks: all nodes without slack, slack: per node slack w.r.t. length
+CriticalPath = namedtuple("CriticalPath", "length path tasks slack")
  
 class TaskGraph:
-    def __init__(self, g, parameters = {}):
-        (g, w, c, t) = self.from_graph(g)
+    def __init__(self, g, parameters = {}, matrices = None, labels = None):
+        """
+        Args:
+            g (): graph_tool Graph with the dependencies
+            parameters (): generator parameters, reported by the benchmarks
+            matrices (): (w, c, t) if already known, otherwise read from g
+            labels (): task labels, otherwise read from the label property of g
+        """
+        if matrices is None:
+            (g, w, c, t) = self.from_graph(g)
+        else:
+            (w, c, t) = matrices
         self.g = g
         self.w = w
         self.c = c
@@ -17,13 +35,68 @@ class TaskGraph:
         self.w_min = np.argmin(self.w, axis=1)
         self.title = self.g.gp.get("title", "No title")
         self.parameters = parameters
+        self.derived = {}
+        self.task_list = None
+        self.labels = labels
         self.init_maps()
 
+    @classmethod
+    def from_arrays(cls, w, src, dst, comm, t = None, labels = None, title = "No title", parameters = {}):
+        """ Build a TaskGraph from plain arrays, without any property maps
+
+            Only the dependency structure is added to the graph_tool Graph, all
+            costs stay in the (possibly memory-mapped) arrays.
+        """
+        num_nodes = len(w)
+        g = Graph()
+        g.add_vertex(num_nodes)
+        g.add_edge_list(np.column_stack((src, dst)))
+        g.gp["title"] = g.new_graph_property("string")
+        g.gp["title"] = title
+
+        if t is None:
+            t = np.zeros(num_nodes)
+        c = EdgeCosts(num_nodes, src, dst, comm)
+        return cls(g, parameters, matrices = (w, c, t), labels = labels)
+
+    def __getstate__(self):
+        # Copies rebuild their tasks and derived data, so the task costs are
+        # views on the copied w
+        state = self.__dict__.copy()
+        state["derived"] = {}
+        state["task_list"] = None
+        return state
+
     def init_maps(self):
         self.g.vp["rank_u"] = self.g.new_vertex_property('int')
         self.g.vp["rank_d"] = self.g.new_vertex_property('int')
 
-    def from_graph(self, g):
+    @staticmethod
+    def from_graph(g):
+        """ Bulk ingestion of w, c and t from the property maps of g """
+        if 'cost' in g.vp:
+            num_pes = len(g.vp['cost'][0])
+            w = np.array(g.vp['cost'].get_2d_array(range(num_pes)).T, dtype=float)
+        else:
+            w = np.zeros((g.num_vertices(), 1))
+
+        if 'type' in g.vp:
+            t = np.array(g.vp['type'].a, dtype=float)
+        else:
+            t = np.zeros((g.num_vertices()))
+
+        if 'comm' in g.ep:
+            edges = g.get_edges([g.ep['comm']])
+            costs = edges[:, 2]
+        else:
+            edges = g.get_edges()
+            costs = np.zeros(len(edges), dtype=int)
+        c = EdgeCosts(g.num_vertices(), edges[:, 0], edges[:, 1], costs)
+        return (g, w, c, t)
+
+    @staticmethod
+    def from_graph_iter(g):
+        """ Element-wise ingestion, kept as a reference for from_graph """
         if 'cost' in g.vp:
             cost = g.vp['cost']
             num_pes = len(cost[0])
@@ -42,13 +115,21 @@ class TaskGraph:
             for v in g.iter_vertices():
                 t[v] = ttype[v]
 
+        src = []
+        dst = []
+        costs = []
         if 'comm' in g.ep:
             com_cost = g.ep['comm']
-            c = np.zeros((g.num_vertices(), g.num_vertices()))
             for s, d, edge_cost in g.iter_edges([com_cost]):
-                c[s, d] = edge_cost
+                src.append(s)
+                dst.append(d)
+                costs.append(edge_cost)
         else:
-            c = np.zeros((g.num_vertices(), g.num_vertices()))
+            for s, d in g.iter_edges():
+                src.append(s)
+                dst.append(d)
+                costs.append(0)
+        c = EdgeCosts(g.num_vertices(), src, dst, costs)
         return (g, w, c, t)
 
     def nodes(self):
@@ -75,70 +156,143 @@ class TaskGraph:
         v = self.g.vertex_index[v]
         return (self.w_min[v], self.w[v, self.w_min[v]])
 
-    def cp_len(self, weights=None):
+    def cp_len(self):
         """ Length of the critical path in terms of w and c """
-
-        g = self.g
-        if g.num_vertices() == 0:
-            return 0;
-
-        if weights is None:
-            weights = self.inclusive_cost_map()
-
-        return self.path_len(self.cp(weights=weights), weights=weights)
+        return self.critical_path().length
 
     def set_task_type(self, task, type):
         self.t[task.index] = type
+        if self.task_list is not None:
+            self.task_list[task.index].type = self.t[task.index] if self.t[task.index] else None
+        self.invalidate()
 
-    def cp(self, weights=None):
+    def cp(self):
         """ Returns the edge list of the critical path """
-        first = self.entry_node()
-        last = self.exit_node()
+        return [self.g.edge(f, t) for (f, t) in pairwise(self.critical_path().path)]
 
-        if weights is None:
-            weights = self.inclusive_cost_map()
-
-        nodes, edges = shortest_path(self.g, source=self.entry_node(), target=self.exit_node(), weights=weights)
+    def critical_path(self):
+        """ The longest path in terms of w_bar and c_bar, with the slack of every node """
+        if "critical_path" not in self.derived:
+            self.derived["critical_path"] = self.compute_critical_path()
+        return self.derived["critical_path"]
 
-        return edges
+    def compute_critical_path(self):
+        """ Longest path based on the ranks
 
+            rank_u(v) + rank_d(v) is the longest path through v, so its maximum is
+            the critical path length and the difference to it is the slack of v.
+            The path itself follows the successors that realize rank_u.
+        """
+        (rank_u, rank_d) = self.ranks()
+        through = rank_u + rank_d
+        length = through.max(initial=0)
+        slack = length - through
+        tasks = np.flatnonzero(np.isclose(slack, 0))
+
+        path = []
+        if self.num_nodes() > 0:
+            v = int(np.argmax(rank_u))
+            path.append(v)
+            while True:
+                (succ, costs) = self.c_bar.row(v)
+                on_path = np.flatnonzero(np.isclose(rank_u[v], self.w_bar[v] + costs + rank_u[succ]))
+                if len(on_path) == 0:
+                    break
+                v = int(succ[on_path[0]])
+                path.append(v)
+
+        return CriticalPath(length, np.array(path, dtype=int), tasks, slack)
+
+    def slack(self):
+        """ Slack of every node w.r.t. the critical path """
+        return self.critical_path().slack
 
     def entry_node(self):
         """ The entry node (a node without in dependencies) """
-        sort = self.sorted_topologically()
-        return self.g.vertex(sort[0])
+        if "entry_node" not in self.derived:
+            self.derived["entry_node"] = self.g.vertex(self.sorted_topologically()[0])
+        return self.derived["entry_node"]
 
     def exit_node(self):
         """ The exit node (a node without out dependencies) """
-        sort = self.sorted_topologically()
-        return self.g.vertex(sort[-1])
+        if "exit_node" not in self.derived:
+            self.derived["exit_node"] = self.g.vertex(self.sorted_topologically()[-1])
+        return self.derived["exit_node"]
 
     def sorted_topologically(self):
-        return topological_sort(self.g)
+        if "topological" not in self.derived:
+            self.derived["topological"] = topological_sort(self.g)
+        return self.derived["topological"]
 
-    def sorted_by_urank(self):
-        sorted_ids = sorted(self.g.get_vertices(), key = lambda v: -(self.rank_u(v)))
-        return [self.task(id) for id in sorted_ids]
+    def fingerprint(self):
+        """ Deterministic hash of the structure and of w, c and t
 
-    def task(self, node_id):
-        label = f"Task {node_id}"
-        if "label" in self.g.vp:
-            label = self.g.vp.label[node_id]
-        cost = self.w[node_id]
-        if self.t[node_id]:
-            ttype = self.t[node_id]
+            Equal graphs get the same fingerprint across runs and processes, so
+            it can be used as a cache key. It is recomputed after invalidate().
+        """
+        if "fingerprint" not in self.derived:
+            h = hashlib.blake2b(digest_size=16)
+            h.update(np.int64(self.num_nodes()).tobytes())
+            for a in [self.c.indptr, self.c.indices]:
+                h.update(np.ascontiguousarray(a, dtype=np.int64).tobytes())
+            for a in [self.c.data, self.w, self.t]:
+                h.update(np.int64(np.ndim(a)).tobytes())
+                h.update(np.array(np.shape(a), dtype=np.int64).tobytes())
+                h.update(np.ascontiguousarray(a, dtype=np.float64).tobytes())
+            self.derived["fingerprint"] = h.hexdigest()
+        return self.derived["fingerprint"]
+
+    def invalidate(self):
+        """ Drop everything derived from the graph and its costs
+
+            Needs to be called after changing g, w, c or t directly. The setters
+            of TaskGraph call it themselves.
+        """
+        self.derived.clear()
+
+    def sorted_by_urank(self):
+        sorted_ids = np.argsort(-self.ranks()[0], kind="stable")
+        tasks = self.tasks()
+        return [tasks[id] for id in sorted_ids]
+
+    def build_tasks(self):
+        """ One Task per node, indexed by node id, with its cost as a view on w """
+        n = self.num_nodes()
+        if self.labels is not None:
+            labels = self.labels
+        elif "label" in self.g.vp:
+            label = self.g.vp.label
+            labels = [label[v] for v in range(n)]
         else:
-            ttype = None
-        return task.Task(node_id, label, cost, ttype)
+            labels = [f"Task {v}" for v in range(n)]
+        return [task.Task(v, labels[v], self.w[v], self.t[v] if self.t[v] else None) for v in range(n)]
 
     def tasks(self):
-        return [self.task(v) for v in self.g.get_vertices()]
+        """ All tasks, indexed by node id
+
+            The list and the tasks are created once per graph and shared by all
+            callers, so they must not be modified.
+        """
+        if self.task_list is None:
+            self.task_list = self.build_tasks()
+        return self.task_list
+
+    def task(self, node_id):
+        return self.tasks()[node_id]
+
+    def predecessors(self):
+        """ Edge costs indexed by target, i.e. row v holds the dependencies of v """
+        if "predecessors" not in self.derived:
+            self.derived["predecessors"] = self.c.transpose()
+        return self.derived["predecessors"]
 
     def dependencies(self, task):
-        return self.g.vertex(task.index).in_neighbors()
+        """ Node ids of the dependencies of task """
+        return self.predecessors().row(task.index)[0]
 
     def task_dependencies(self, task):
-        return [self.task(int(v)) for v in self.g.vertex(task.index).in_neighbors()]
+        tasks = self.tasks()
+        return [tasks[v] for v in self.dependencies(task)]
 
     def inclusive_cost_map(self):
         """ Returns an edge property map with computing cost included
@@ -149,26 +303,26 @@ class TaskGraph:
 
         # Accumulated cost (source node weight + edge weight)
         g = self.g
-        if "inclusive_cost" not in g.ep:
+        if "inclusive_cost" not in self.derived:
             weight_map = g.new_edge_property("int32_t", np.iinfo(np.int32).max)
-            for v, v_idx in g.iter_vertices([g.vertex_index]):
-               for f, t, e_idx, cost in g.iter_out_edges(v, [g.edge_index, g.ep['comm']]):
-                   res = self.w_bar[v_idx] + self.c[f][t]
-                   weight_map[g.edge(f, t)] = res
+            edges = g.get_edges([g.edge_index])
+            (src, dst, idx) = (edges[:, 0], edges[:, 1], edges[:, 2])
+            weight_map.a[idx] = self.w_bar[src] + self.c.lookup(src, dst)
             g.ep["inclusive_cost"] = weight_map
+            self.derived["inclusive_cost"] = weight_map
 
-        return g.ep["inclusive_cost"]
+        return self.derived["inclusive_cost"]
 
     def task_cost(self, task, pe):
-        return self.g.vp.cost[task.index][pe.index]
+        return int(self.w[task.index, pe.index])
 
     def edge(self, src_task, dst_task):
         return self.g.edge(src_task.index, dst_task.index)
 
     def edge_cost(self, src_task, dst_task):
-        edge = self.g.edge(src_task.index, dst_task.index)
-        assert(edge is not None)
-        return self.g.ep.comm[edge]
+        pos = self.c.position(src_task.index, dst_task.index)
+        assert(pos >= 0)
+        return self.c.data[pos]
 
     def set_uniform_cost(self, cost):
         if "cost" not in self.g.vp:
@@ -177,6 +331,7 @@ class TaskGraph:
             self.g.vp.cost[v] = [cost]
             self.w[v][0] = cost
             self.w_bar[v] = cost
+        self.invalidate()
         return self
 
     def set_uniform_comm(self, comm_cost):
@@ -184,31 +339,140 @@ class TaskGraph:
             self.g.ep["comm"] = self.g.new_edge_property("int");
         for e in self.g.edges():
             self.g.ep.comm[e] = comm_cost
-            (src, tgt) = e
-            
-            self.c[int(src), int(tgt)] = comm_cost
-            self.c_bar[int(src), int(tgt)] = comm_cost
+        # c_bar is the same store as c
+        self.c.fill(comm_cost)
+        self.invalidate()
         return self
 
+    def transitive_reduction(self, zero_cost_only = True):
+        """ Remove dependencies that are implied by a longer path
+
+            An edge (u, v) is redundant if v can also be reached from another
+            successor of u. Dropping an edge with communication cost would lose
+            that transfer, so by default only edges without cost are removed.
+            Reachability is kept as one bitset per node, i.e. O(V^2) bits.
+
+            Returns the number of removed edges.
+        """
+        (src, dst, cost) = self.c.edges()
+        reach = [0] * self.num_nodes()
+        redundant = np.zeros(len(src), dtype=bool)
+
+        for u in np.argsort(-self.levels(), kind="stable"):
+            lower = self.c.indptr[u]
+            successors = self.c.indices[lower:self.c.indptr[u + 1]]
+            via = 0
+            for v in successors:
+                via |= reach[v]
+            for (i, v) in enumerate(successors):
+                if (via >> int(v)) & 1:
+                    redundant[lower + i] = True
+                via |= 1 << int(v)
+            reach[u] = via
+
+        if zero_cost_only:
+            redundant &= cost == 0
+
+        for (u, v) in zip(src[redundant], dst[redundant]):
+            for e in self.g.edge(u, v, all_edges=True):
+                self.g.remove_edge(e)
+
+        keep = ~redundant
+        self.c = EdgeCosts(self.num_nodes(), src[keep], dst[keep], cost[keep])
+        self.c_bar = self.c
+        self.invalidate()
+        return int(redundant.sum())
+
     def show(self):
         pass
 
 
-    @cache
+    def compute_levels(self):
+        """ Level of each node, i.e. the number of edges on the longest path from an entry node
+
+            The levels are peeled off front by front (Kahn's algorithm), with the
+            out-edges of a whole front handled in one go on the edge store.
+        """
+        n = self.num_nodes()
+        indptr = self.c.indptr
+        indices = self.c.indices
+
+        in_degree = np.bincount(indices, minlength=n)
+        level = np.full(n, -1)
+        front = np.flatnonzero(in_degree == 0)
+        depth = 0
+        while len(front):
+            level[front] = depth
+            starts = indptr[front]
+            counts = indptr[front + 1] - starts
+            # Positions of all out-edges of the front in the edge store
+            offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            targets = indices[offsets]
+            np.subtract.at(in_degree, targets, 1)
+            front = np.unique(targets[in_degree[targets] == 0])
+            depth += 1
+
+        assert (level >= 0).all(), "The task graph contains a cycle"
+        return level
+
+    def levels(self):
+        """ Array of node levels, computed once and dropped when the graph changes """
+        if "levels" not in self.derived:
+            self.derived["levels"] = self.compute_levels()
+        return self.derived["levels"]
+
+    def compute_ranks(self):
+        """ Upward and downward rank of all nodes
+
+            Nodes are processed level by level, forwards for rank_d and backwards
+            for rank_u, so every rank only depends on ranks that are already final.
+        """
+        n = self.num_nodes()
+        src, dst, cost = self.c_bar.edges()
+        level = self.levels()
+        depth = level.max(initial=-1) + 1
+        steps = np.arange(depth + 1)
+
+        # Downward rank: group edges by the level of their target
+        by_dst = np.argsort(level[dst], kind="stable")
+        bounds = np.searchsorted(level[dst][by_dst], steps)
+        rank_d = np.zeros(n)
+        for l in range(1, depth):
+            e = by_dst[bounds[l]:bounds[l + 1]]
+            np.maximum.at(rank_d, dst[e], rank_d[src[e]] + self.w_bar[src[e]] + cost[e])
+
+        # Upward rank: group edges and nodes by the level of their source
+        by_src = np.argsort(level[src], kind="stable")
+        bounds = np.searchsorted(level[src][by_src], steps)
+        by_level = np.argsort(level, kind="stable")
+        node_bounds = np.searchsorted(level[by_level], steps)
+        successors = np.zeros(n)
+        rank_u = np.zeros(n)
+        for l in reversed(range(depth)):
+            e = by_src[bounds[l]:bounds[l + 1]]
+            np.maximum.at(successors, src[e], cost[e] + rank_u[dst[e]])
+            v = by_level[node_bounds[l]:node_bounds[l + 1]]
+            rank_u[v] = self.w_bar[v] + successors[v]
+
+        self.g.vp['rank_u'].a = rank_u
+        self.g.vp['rank_d'].a = rank_d
+        return (rank_u, rank_d)
+
+    def ranks(self):
+        """ Arrays (rank_u, rank_d), computed once and dropped when costs change """
+        if "ranks" not in self.derived:
+            self.derived["ranks"] = self.compute_ranks()
+        return self.derived["ranks"]
+
     def rank_u(self, v):
         """ Get the upper rank of node v """
-        value = self.w_bar[v] + max(
-                [self.c_bar[v][w] + self.rank_u(w) for w in self.g.get_out_neighbors(v)],
-                default=0)
-        self.g.vp['rank_u'][v] = value
-        return value
+        return self.ranks()[0][v]
 
-    @cache
     def rank_d(self, v):
         """ Get the downwards rank of node v """
-        value = max(
-                    [self.rank_d(w) + self.w_bar[w] + self.c_bar[v][w] for w in self.g.get_in_neighbors(v)],
-                    default=0)
-        self.g.vp['rank_d'][v] = value
-        return value
+        return self.ranks()[1][v]
 
+    def priorities(self):
+        """ CPOP priority rank_u + rank_d of all nodes """
+        (rank_u, rank_d) = self.ranks()
+        return rank_u + rank_d
@@ -2,16 +2,24 @@ from graph_tool import load_graph
 from graph_tool import topology
 from math import sqrt
 from resch import graph
+import json
 import matplotlib as mpl
 import numpy as np
-from os.path import dirname
+import sys
+from os.path import basename, dirname, isdir, join
 from os import makedirs
 
+# Version of the binary task graph format written by save_binary
+BINARY_VERSION = 1
+
 def import_dot(file):
     return gt.load_graph(file, fmt="dot")
 
 def load(file):
-    """Returns a (g, w, c, t) for a given graph file in GraphML"""
+    """Returns a TaskGraph for a given graph file in GraphML or a binary task graph directory"""
+    if isdir(file):
+        return load_binary(file)
+
     g = load_graph(file)
     g.gp["title"] = g.new_gp("string")
     g.gp["title"] = file
@@ -22,6 +30,85 @@ def save(g, file):
     makedirs(dirname(file), exist_ok = True)
     g.save(file, fmt="graphml")
 
+def save_binary(G, path):
+    """
+
+    Save a TaskGraph as a directory of .npy arrays
+
+    The edge list, the edge costs, w, t and the labels are stored as separate
+    arrays, so load_binary can memory-map them instead of parsing anything.
+
+    Args:
+        G (): TaskGraph
+        path (): directory to write to
+    """
+    makedirs(path, exist_ok = True)
+    (src, dst, comm) = G.c.edges()
+    np.save(join(path, "src.npy"), src)
+    np.save(join(path, "dst.npy"), dst)
+    np.save(join(path, "comm.npy"), comm)
+    np.save(join(path, "w.npy"), G.w)
+    np.save(join(path, "t.npy"), G.t)
+    np.save(join(path, "labels.npy"), np.array([task.label for task in G.tasks()], dtype=str))
+
+    meta = {"version": BINARY_VERSION, "title": G.title, "num_nodes": G.num_nodes(), "parameters": G.parameters}
+    with open(join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+def load_binary(path, mmap = True):
+    """
+
+    Load a TaskGraph written by save_binary
+
+    Args:
+        path (): directory of the binary task graph
+        mmap (): memory-map the arrays (copy-on-write) instead of reading them
+
+    Returns:
+        TaskGraph
+    """
+    with open(join(path, "meta.json")) as f:
+        meta = json.load(f)
+    assert meta["version"] == BINARY_VERSION, f"Unsupported binary task graph version {meta['version']}"
+
+    mmap_mode = "c" if mmap else None
+    arrays = {name: np.load(join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ["src", "dst", "comm", "w", "t", "labels"]}
+
+    return graph.TaskGraph.from_arrays(
+            arrays["w"], arrays["src"], arrays["dst"], arrays["comm"],
+            t = arrays["t"],
+            labels = arrays["labels"],
+            title = meta["title"],
+            parameters = meta["parameters"])
+
+def convert(files, out_dir):
+    """
+
+    Convert GraphML task graphs to the binary format
+
+    Args:
+        files (): GraphML files (plain or gzip)
+        out_dir (): directory that receives one binary task graph per file
+
+    Returns:
+        list of the written directories
+    """
+    written = []
+    for file in files:
+        name = basename(file)
+        for ext in [".gz", ".xml", ".graphml"]:
+            if name.endswith(ext):
+                name = name[:-len(ext)]
+        path = join(out_dir, name)
+        save_binary(load(file), path)
+        written.append(path)
+    return written
+
 def save_pdf(g, file):
     vpr = {"label": g.vp.label}
     # draw.graphviz_draw(g, vcolor=g.vp.type, vcmap=mpl.colormaps['Pastel1'], layout="dot", output="reft.pdf", vnorm=0,vprops=vpr)
+
+if __name__ == "__main__":
+    # python -m resch.graph.util OUT_DIR GRAPH...
+    for path in convert(sys.argv[2:], sys.argv[1]):
+        print(path)
@@ -1,8 +1,14 @@
-from collections import defaultdict
+import hashlib
+import json
+import numpy as np
+from collections import defaultdict, namedtuple
 from graph_tool import Graph, GraphView
-from graph_tool.topology import shortest_path
+from graph_tool.topology import shortest_distance, shortest_path
 from graph_tool.util import find_vertex
 
+# Index arrays of the placements of a task type, aligned with Machine.placements()
+PlacementArrays = namedtuple("PlacementArrays", "pe location original_index overhead")
+
 class IndexEqualityMixin(object):
     def __eq__(self, other):
         return (isinstance(other, self.__class__)
@@ -55,19 +61,40 @@ class PE:
 class Accelerator:
     def __init__(self, PEs):
         self.PEs = PEs
+        self.derived = {}
+
+    def invalidate(self):
+        """ Drop the indexes, needed if PEs are changed without add_pe() """
+        self.derived.clear()
+
+    def add_pe(self, pe):
+        self.PEs.append(pe)
+        self.invalidate()
+
+    def index(self):
+        """ PEs, configurations and locations by their index, built once """
+        if "index" not in self.derived:
+            PEs = {pe.index: pe for pe in self.PEs}
+            configurations = {pe.configuration.index: pe.configuration for pe in self.PEs}
+            locations = {loc.index: loc for config in configurations.values() for loc in config.locations}
+            self.derived["index"] = (PEs, configurations, locations)
+        return self.derived["index"]
 
     def get_pe(self, index):
-        return next(pe for pe in self.PEs if pe.index == index)
+        return self.index()[0][index]
 
     def configurations(self):
-        return list(set([pe.configuration for pe in self.PEs]))
+        if "configurations" not in self.derived:
+            self.derived["configurations"] = tuple(sorted(self.index()[1].values(), key=lambda c: c.index))
+        return self.derived["configurations"]
 
     def locations(self):
-        locations = set()
-        for config in self.configurations():
-            for loc in config.locations:
-                locations.add(loc)
-        return locations
+        if "locations" not in self.derived:
+            self.derived["locations"] = tuple(sorted(self.index()[2].values(), key=lambda l: l.index))
+        return self.derived["locations"]
+
+    def location(self, index):
+        return self.index()[2][index]
 
 class Properties:
     def __init__(self, pe_properties = {}, c_properties = {}, l_properties = {}, m_properties = {}):
@@ -75,24 +102,95 @@ class Properties:
         self.P_c = defaultdict(dict, c_properties)
         self.P_l = defaultdict(dict, l_properties)
         self.P_m = m_properties
+        self.tables = {PE: self.P_p, Configuration: self.P_c, Location: self.P_l}
 
     def __getitem__(self, key):
-        if type(key) == PE:
-            return self.P_p[key]
-        if type(key) == Configuration:
-            return self.P_c[key]
-        if type(key) == Location:
-            return self.P_l[key]
+        table = self.tables.get(type(key))
+        if table is not None:
+            return table[key]
         if type(key) == Machine:
             return self.P_m
         assert(False)
 
+    def canonical(self):
+        """ All non-empty properties as sorted lists, e.g. for hashing """
+        def table(P):
+            return sorted((key.index, sorted(props.items())) for key, props in P.items() if props)
+        return {"pe": table(self.P_p), "configuration": table(self.P_c), "location": table(self.P_l), "machine": sorted(self.P_m.items())}
+
 
 class Topology:
     def __init__(self, g = None, PE_map = {}):
         self.g = g
         self.PE_g = GraphView(g, vfilt=self.g.vp.is_PE)
         self.PE_map = PE_map
+        self.derived = {}
+        self.pe_paths()
+
+    def invalidate(self):
+        """ Drop everything derived from the links, e.g. after changing capacities """
+        self.derived.clear()
+
+    def links(self):
+        """ Ids of all links, i.e. the edge index of each edge """
+        return self.g.get_edges([self.g.edge_index])[:, 2]
+
+    def link(self, src, dst):
+        """ Id of the link between two vertices """
+        return int(self.g.edge_index[self.g.edge(src, dst)])
+
+    def link_endpoints(self, link):
+        """ Source and target vertex of a link id """
+        if "endpoints" not in self.derived:
+            edges = self.g.get_edges([self.g.edge_index])
+            endpoints = np.zeros((self.g.edge_index_range, 2), dtype=int)
+            endpoints[edges[:, 2]] = edges[:, :2]
+            self.derived["endpoints"] = endpoints
+        (src, dst) = self.derived["endpoints"][link]
+        return (int(src), int(dst))
+
+    def set_capacity(self, link, capacity):
+        self.g.ep.capacity.a[link] = capacity
+        self.invalidate()
+
+    def pe_paths(self):
+        """
+        Links between all pairs of placed PEs, computed once
+
+        Returns:
+            Dictionary (src_placed, dst_placed) -> tuple of link ids
+        """
+        if "paths" not in self.derived:
+            paths = {}
+            for src_placed, src in self.PE_map.items():
+                (_, pred) = shortest_distance(self.g, source=src, pred_map=True)
+                for dst_placed, dst in self.PE_map.items():
+                    # Walk back from dst, the same way shortest_path does
+                    path = []
+                    v = int(dst)
+                    while v != int(src) and pred[v] != v:
+                        path.append(self.link(pred[v], v))
+                        v = int(pred[v])
+                    paths[(src_placed, dst_placed)] = tuple(reversed(path)) if v == int(src) else ()
+            self.derived["paths"] = paths
+        return self.derived["paths"]
+
+    def min_capacity(self, src_placed, dst_placed):
+        """ Smallest relative capacity along the path between two placed PEs """
+        if "min_capacity" not in self.derived:
+            capacity = self.g.ep.capacity.a
+            self.derived["min_capacity"] = {key: min((capacity[link] for link in path), default=1) for key, path in self.pe_paths().items()}
+        return self.derived["min_capacity"][(src_placed, dst_placed)]
+
+    def fingerprint(self):
+        """ Deterministic hash of the links, their capacities and the PE placements """
+        if "fingerprint" not in self.derived:
+            h = hashlib.blake2b(digest_size=16)
+            edges = self.g.get_edges([self.g.edge_index, self.g.ep.capacity])
+            h.update(np.ascontiguousarray(edges, dtype=np.float64).tobytes())
+            h.update(json.dumps(sorted((k, int(v)) for k, v in self.PE_map.items())).encode())
+            self.derived["fingerprint"] = h.hexdigest()
+        return self.derived["fingerprint"]
 
     @classmethod
     def default_from_accelerator(cls, acc):
@@ -186,14 +284,12 @@ class Topology:
         return edges
 
     def pe_path(self, src_placed, dst_placed):
+        """ Link ids from one placed PE to another, see pe_paths() """
         assert src_placed in self.PE_map, src_placed
         assert dst_placed in self.PE_map, dst_placed
 
-        src_node = self.PE_map[src_placed] 
-        dst_node = self.PE_map[dst_placed] 
-        path = self.path(src_node, dst_node)
+        path = self.pe_paths()[(src_placed, dst_placed)]
 
-        assert(src_placed == dst_placed or src_node != dst_node)
         assert(src_placed == dst_placed or len(path) > 0)
 
         return path
@@ -204,9 +300,9 @@ class Topology:
         Get the relative capacity from 0 < c <= 1
 
         Args:
-            link (): the edge in the topology
+            link (): the link id in the topology
         """
-        return self.g.ep.capacity[link]
+        return self.g.ep.capacity.a[link]
 
     def show(self):
         pass
@@ -217,10 +313,68 @@ class Machine:
         self.accelerator = acc
         self.topology = topo
         self.properties = properties
+        self.derived = {}
+
+    def invalidate(self):
+        """ Drop cached placements, e.g. after changing the PE types in the properties """
+        self.derived.clear()
+        self.accelerator.invalidate()
 
     def get_pe(self, index):
         return self.accelerator.get_pe(index)
 
+    def eligible(self, pe, ttype):
+        """ A PE without a type "t" executes everything, otherwise only its type """
+        P_p = self.properties[pe]
+        return "t" not in P_p or P_p["t"] == ttype
+
+    def placements(self, ttype):
+        """
+        All (PE, location) pairs that can execute a task type
+
+        The pairs are ordered by location first and only contain locations of
+        the PE's configuration. They are computed once per task type and PE
+        types, so changing "t" in the properties takes effect right away.
+
+        Args:
+            ttype (): task type, None for untyped tasks
+
+        Returns:
+            Tuple of (PE, Location)
+        """
+        placements = self.derived.setdefault("placements", {})
+        key = (ttype, self.pe_types())
+        if key not in placements:
+            placements[key] = tuple((p, l) for l in self.locations() for p in self.PEs()
+                                    if l in p.configuration.locations and self.eligible(p, ttype))
+        return placements[key]
+
+    def pe_types(self):
+        """ Whether each PE has a type property "t" and its value """
+        return tuple(("t" in self.properties[p], self.properties[p].get("t")) for p in self.PEs())
+
+    def placement_arrays(self, ttype):
+        """
+        PE index, location index, original PE index and reconfiguration overhead of each placement
+
+        The indices are computed once per task type. The overhead is read from
+        the properties on every call, as "r" is changed between runs on the
+        same machine.
+        """
+        arrays = self.derived.setdefault("placement_arrays", {})
+        key = (ttype, self.pe_types())
+        if key not in arrays:
+            placements = self.placements(ttype)
+            position = {l: k for k, l in enumerate(self.locations())}
+            arrays[key] = (
+                np.array([p.index for (p, _) in placements], dtype=int),
+                np.array([l.index for (_, l) in placements], dtype=int),
+                np.array([p.original_index for (p, _) in placements], dtype=int),
+                np.array([position[l] for (_, l) in placements], dtype=int))
+        (pe, location, original_index, location_position) = arrays[key]
+        overhead = np.array([self.properties[l].get("r", 0) for l in self.locations()])
+        return PlacementArrays(pe, location, original_index, overhead[location_position])
+
     def PEs(self):
         return self.accelerator.PEs
 
@@ -228,7 +382,23 @@ class Machine:
         return self.accelerator.locations()
 
     def location(self, index):
-        return next(l for l in self.locations() if l.index == index)
+        return self.accelerator.location(index)
 
     def configurations(self):
         return self.accelerator.configurations()
+
+    def fingerprint(self):
+        """ Deterministic hash of the PE, configuration and location layout, the properties and the topology
+
+            PEs and properties are plain objects and dicts that are changed in
+            place, so this part is serialized on every call. It is small compared
+            to a task graph, and the topology caches its own part.
+        """
+        layout = {
+            "PEs": [(pe.index, pe.configuration.index, pe.original_index) for pe in sorted(self.PEs(), key=lambda pe: pe.index)],
+            "configurations": [(c.index, sorted(l.index for l in c.locations)) for c in sorted(self.configurations(), key=lambda c: c.index)],
+            "properties": self.properties.canonical()
+        }
+        h = hashlib.blake2b(json.dumps(layout, sort_keys=True, default=str).encode(), digest_size=16)
+        h.update(self.topology.fingerprint().encode())
+        return h.hexdigest()
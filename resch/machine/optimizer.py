@@ -30,24 +30,31 @@ class GA:
 
             for pe in c.PEs:
                 g.w[:,pe.original_index] = g.w[:,pe.original_index] / (1.00001 - x)
+        g.invalidate()
 
     def apply_optimizations(self, mm, g):
         for c in mm.configurations():
             for pe in c.PEs:
                 g.w[:,pe.original_index] = g.w[:,pe.original_index] / mm.properties[pe]["factor"]
+        g.invalidate()
 
     def generate(self, gene_space, k = 1, solutions = [], fitnesses = [], initial_population=None):
 
         # TODO: cleanup
         solutions_d = []
+        # different chromosomes often decode to the same machine
+        schedules = {}
         def fitness(ga_instance, solution, solution_index):
             mm = self.chromosome_to_mm(solution)
-            g = copy.deepcopy(self.g)
-            self.apply_cong(mm, g)
-            self.apply_optimizations(mm, g)
-
-            R = scheduling.reft.REFT(mm, g, schedule.NoEdgeSchedule)
-            (S, E) = R.schedule()
+            key = mm.fingerprint()
+            if key not in schedules:
+                g = copy.deepcopy(self.g)
+                self.apply_cong(mm, g)
+                self.apply_optimizations(mm, g)
+
+                R = scheduling.reft.REFT(mm, g, schedule.NoEdgeSchedule)
+                schedules[key] = R.schedule()
+            (S, E) = schedules[key]
             print(S.length(), solution)
 
             fit = 1.0/S.length()
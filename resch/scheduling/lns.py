@@ -0,0 +1,292 @@
+import collections
+import math
+import numpy as np
+import portion as po
+import random
+import time
+from ortools.sat.python import cp_model
+
+import resch.scheduling.reft as reft
+import resch.scheduling.schedule as schedule
+import resch.scheduling.task as task_m
+
+# The makespan after an improving iteration, wall time since the start
+Step = collections.namedtuple("Step", "wall iteration makespan")
+
+def merged(segments):
+    """ Union of (lower, upper) segments as a sorted list of disjoint segments """
+    result = []
+    for (lower, upper) in sorted(segments):
+        if result and lower <= result[-1][1]:
+            result[-1] = (result[-1][0], max(result[-1][1], upper))
+        else:
+            result.append((lower, upper))
+    return result
+
+class LNS:
+    """ Large-neighbourhood search on top of a REFT schedule
+
+        Every iteration frees a small set of tasks, either consecutive in time
+        or connected in the task graph, and re-optimises their placements and
+        times with CP-SAT while all other tasks stay where they are. The free
+        tasks have to stay within the time window they occupied, so only
+        nearby tasks become constraints of the sub-model. Afterwards every
+        task is moved as far left as its placement allows, which carries
+        the improvement through the rest of the schedule.
+
+        The schedules are the same kind as those of REFT and OptimalScheduler
+        with a NoEdgeSchedule: a task waits for its dependencies to finish
+        and links are not scheduled.
+    """
+
+    def __init__(self, M, G, size = 10, neighbourhood = "mixed", sub_time_limit = 0.2, workers = 1, seed = 0):
+        """
+        Args:
+            M (): machine model
+            G (): TaskGraph
+            size (): number of tasks to re-optimise per iteration
+            neighbourhood (): "window", "graph" or "mixed" to alternate both
+            sub_time_limit (): time limit of a single sub-model in seconds
+            workers (): number of CP-SAT workers per sub-model
+            seed (): seed of the neighbourhood selection
+        """
+        assert neighbourhood in ["window", "graph", "mixed"]
+        self.M = M
+        self.G = G
+        self.size = size
+        self.neighbourhood = neighbourhood
+        self.sub_time_limit = sub_time_limit
+        self.workers = workers
+        self.random = random.Random(seed)
+        self.history = []
+
+    def schedule(self, time_limit = 10, iterations = None):
+        """
+        Improve a REFT schedule until the budget is used up
+
+        Args:
+            time_limit (): wall-clock budget in seconds
+            iterations (): maximum number of iterations, None for no limit
+
+        Returns:
+            (Schedule, NoEdgeSchedule) of the best schedule found
+        """
+        start = time.time()
+        G = self.G
+        self.tasks = G.tasks()
+        self.rank = np.empty(G.num_nodes(), dtype=int)
+        self.rank[np.asarray(G.sorted_topologically(), dtype=int)] = np.arange(G.num_nodes())
+
+        (S, E) = reft.REFT(self.M, G).schedule()
+        self.history = [Step(wall=time.time() - start, iteration=0, makespan=S.length())]
+
+        iteration = 0
+        while time.time() - start < time_limit and (iterations is None or iteration < iterations):
+            iteration += 1
+            if self.neighbourhood == "window" or (self.neighbourhood == "mixed" and iteration % 2):
+                free = self.time_window(S)
+            else:
+                free = self.graph_neighbourhood(S)
+
+            placed = self.reoptimise(S, free, time_limit - (time.time() - start))
+            if placed is None:
+                continue
+
+            (S_new, E_new) = self.compact(S, placed)
+            if S_new.length() <= S.length():
+                improved = S_new.length() < S.length()
+                (S, E) = (S_new, E_new)
+                if improved:
+                    self.history.append(Step(wall=time.time() - start, iteration=iteration, makespan=S.length()))
+
+        return (S, E)
+
+    def time_window(self, S):
+        """ size tasks that are consecutive by start time, from a random position """
+        order = sorted(S.instances, key=lambda i: (i.interval.lower, i.interval.upper))
+        first = self.random.randrange(max(1, len(order) - self.size + 1))
+        return [i.task for i in order[first:first + self.size]]
+
+    def graph_neighbourhood(self, S):
+        """ size tasks found by a breadth-first search through dependencies and successors from a random task """
+        G = self.G
+        root = self.random.randrange(G.num_nodes())
+        found = {root}
+        queue = collections.deque([root])
+        while queue and len(found) < self.size:
+            v = queue.popleft()
+            neighbours = np.concatenate((G.c.row(v)[0], G.predecessors().row(v)[0]))
+            for u in map(int, neighbours):
+                if u not in found and len(found) < self.size:
+                    found.add(u)
+                    queue.append(u)
+        return [self.tasks[v] for v in sorted(found)]
+
+    def reoptimise(self, S, free, time_left):
+        """
+        Solve the placements and times of the free tasks, the rest is fixed
+
+        Args:
+            S (): incumbent Schedule
+            free (): list of Task to re-optimise
+            time_left (): remaining budget in seconds
+
+        Returns:
+            dict of task index to (PE, Location, t_s, t_f) of the free tasks,
+            None if the solver found no solution
+        """
+        M = self.M
+        G = self.G
+        model = cp_model.CpModel()
+
+        free_index = {task.index for task in free}
+        lower = math.floor(min(S.instance(task).interval.lower for task in free))
+        upper = math.ceil(max(S.instance(task).interval.upper for task in free))
+
+        T_s = {}
+        T_f = {}
+        active = {} # (task index, pe, location) -> Bool
+        intervals = collections.defaultdict(list) # (pe, location) -> intervals
+        configured = collections.defaultdict(list) # (task index, location, configuration) -> Bools
+        for task in free:
+            v = task.index
+            T_s[v] = model.NewIntVar(lower, upper, f"T_s_{v}")
+            T_f[v] = model.NewIntVar(lower, upper, f"T_f_{v}")
+            # Start from the incumbent
+            instance = S.instance(task)
+            model.AddHint(T_s[v], math.floor(instance.interval.lower))
+            model.AddHint(T_f[v], math.ceil(instance.interval.upper))
+            literals = []
+            for (pe, l) in M.placements(task.type):
+                a = model.NewBoolVar(f"active_{v}_{pe.index}_{l.index}")
+                model.AddHint(a, (pe.index, l.index) == instance.placed_pe())
+                cost = int(task.cost[pe.original_index])
+                interval = model.NewOptionalIntervalVar(T_s[v], cost, T_f[v], a, f"interval_{v}_{pe.index}_{l.index}")
+                active[(v, pe.index, l.index)] = a
+                literals.append(a)
+                if cost > 0:
+                    intervals[(pe.index, l.index)].append(interval)
+                    configured[(v, l.index, pe.configuration.index)].append(a)
+            model.AddExactlyOne(literals)
+
+        # Dependencies, like in REFT and OptimalScheduler with a
+        # NoEdgeSchedule a task waits for its dependencies to finish
+        for task in free:
+            v = task.index
+            for u in map(int, G.dependencies(task)):
+                if u in free_index:
+                    model.Add(T_f[u] <= T_s[v])
+                else:
+                    model.Add(T_s[v] >= math.ceil(S.instance(self.tasks[u]).interval.upper))
+            for w in map(int, G.c.row(v)[0]):
+                if w not in free_index:
+                    model.Add(T_f[v] <= math.floor(S.instance(self.tasks[w]).interval.lower))
+
+        # Fixed tasks close to the window block their PE and, including the
+        # reconfiguration overhead, their location
+        fixed = collections.defaultdict(list) # (location, configuration) -> (t_s, t_f)
+        for instance in S.instances:
+            if instance.task.index in free_index or instance.interval.lower == instance.interval.upper:
+                continue
+            (t_s, t_f) = (math.floor(instance.interval.lower), math.ceil(instance.interval.upper))
+            overhead = M.properties[instance.location].get("r", 0)
+            if t_f + overhead <= lower or t_s - overhead >= upper:
+                continue
+            (p_id, l_id) = instance.placed_pe()
+            if t_f > lower and t_s < upper:
+                intervals[(p_id, l_id)].append(model.NewFixedSizeIntervalVar(t_s, t_f - t_s, f"fixed_{instance.task.index}"))
+            fixed[(l_id, instance.pe.configuration.index)].append((t_s, t_f))
+
+        for placed in intervals.values():
+            if len(placed) > 1:
+                model.AddNoOverlap(placed)
+
+        # Different configurations on a location are r apart. A free task is
+        # on a (location, configuration) if one of its placements there is
+        # active. One Bool orders each pair of free tasks, the fixed tasks of
+        # a configuration are merged into segments.
+        on = collections.defaultdict(list) # location -> (task index, configuration, Bool)
+        for ((v, l_id, c_id), literals) in configured.items():
+            if len(literals) == 1:
+                on[l_id].append((v, c_id, literals[0]))
+            else:
+                literal = model.NewBoolVar(f"on_{v}_{l_id}_{c_id}")
+                model.Add(sum(literals) == literal)
+                on[l_id].append((v, c_id, literal))
+
+        order = {}
+        for l_id, occupants in on.items():
+            overhead = M.properties[M.location(l_id)].get("r", 0)
+            for k, (v_a, c_a, lit_a) in enumerate(occupants):
+                for (v_b, c_b, lit_b) in occupants[k + 1:]:
+                    if c_a == c_b or v_a == v_b:
+                        continue
+                    key = (min(v_a, v_b), max(v_a, v_b))
+                    if key not in order:
+                        order[key] = model.NewBoolVar(f"before_{key}")
+                    before = order[key] if v_a < v_b else order[key].Not()
+                    model.Add(T_f[v_a] + overhead <= T_s[v_b]).OnlyEnforceIf([before, lit_a, lit_b])
+                    model.Add(T_f[v_b] + overhead <= T_s[v_a]).OnlyEnforceIf([before.Not(), lit_a, lit_b])
+
+            for ((l_fixed, c_fixed), segments) in fixed.items():
+                if l_fixed != l_id:
+                    continue
+                for (t_s, t_f) in merged(segments):
+                    for (v, c_id, literal) in occupants:
+                        if c_id == c_fixed:
+                            continue
+                        before = model.NewBoolVar(f"before_{v}_{l_id}_{t_s}")
+                        model.Add(T_f[v] + overhead <= t_s).OnlyEnforceIf([before, literal])
+                        model.Add(T_s[v] >= t_f + overhead).OnlyEnforceIf([before.Not(), literal])
+
+        # Finish the free tasks early, the latest one first of all
+        local_makespan = model.NewIntVar(lower, upper, "local_makespan")
+        model.AddMaxEquality(local_makespan, list(T_f.values()))
+        model.Minimize(len(free) * local_makespan + sum(T_f.values()))
+
+        solver = cp_model.CpSolver()
+        solver.parameters.max_time_in_seconds = max(0.0, min(self.sub_time_limit, time_left))
+        solver.parameters.num_workers = self.workers
+        status = solver.Solve(model)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return None
+
+        placed = {}
+        for ((v, p_id, l_id), a) in active.items():
+            if solver.Value(a):
+                placed[v] = (M.get_pe(p_id), M.location(l_id), solver.Value(T_s[v]), solver.Value(T_f[v]))
+        return placed
+
+    def compact(self, S, placed):
+        """
+        Move every task as far left as its placement allows
+
+        The tasks are scheduled again in the order of their start times, each
+        on its placement and at its earliest start, so no task starts later
+        than before.
+
+        Args:
+            S (): incumbent Schedule
+            placed (): dict of task index to (PE, Location, t_s, t_f) that replace the instances in S
+
+        Returns:
+            (Schedule, NoEdgeSchedule)
+        """
+        M = self.M
+        G = self.G
+        rows = []
+        for instance in S.instances:
+            v = instance.task.index
+            (pe, l, t_s, t_f) = placed.get(v, (instance.pe, instance.location, instance.interval.lower, instance.interval.upper))
+            rows.append((t_s, t_f, self.rank[v], v, pe, l))
+        rows.sort(key=lambda row: row[:3])
+
+        S_new = schedule.Schedule()
+        E_new = schedule.NoEdgeSchedule(G, M)
+        for (_, _, _, v, pe, l) in rows:
+            task = self.tasks[v]
+            dependencies = S_new.instances_for_tasks(G.dependencies(task))
+            ready = max((E_new.allocate_path(i, task, pe, l).upper for i in dependencies), default = 0)
+            interval = S_new.EFT(task, pe, l, po.closedopen(ready, po.inf), M.properties[l].get("r", 0))
+            S_new.add_task(task_m.ScheduledTask(task, schedule.Instance(task, pe, l, interval)))
+        return (S_new, E_new)
@@ -1,59 +1,277 @@
 import collections
+import math
+import time
 from ortools.sat.python import cp_model
 
 from itertools import combinations
 
+import resch.scheduling.reft as reft
 import resch.scheduling.schedule as schedule
 import resch.scheduling.task as task
 import portion as po
 
 
+InstanceVar = collections.namedtuple("Instance", "t_s cost t_f active interval pe location task ttype intcost")
+                                                    # ^^^^ only for NewOptionalIntervalVar
+LinkInstanceVar = collections.namedtuple("LinkInstance", "t_s cost t_f interval active")
+# Reported to the progress callback for every improving solution
+Progress = collections.namedtuple("Progress", "wall objective bound gap")
+
 # Takes a graph and machine models and gets the optimal schedule
 class OptimalScheduler:
-    def __init__(self, M, G, E_cls = schedule.NoEdgeSchedule):
+    def __init__(self, M, G, E_cls = schedule.NoEdgeSchedule, reconfiguration = "tasks"):
+        """
+        Args:
+            M (): machine model
+            G (): TaskGraph
+            E_cls (): edge schedule class
+            reconfiguration (): "tasks" or "instances", see
+                add_task_reconfiguration() and add_instance_reconfiguration()
+        """
+        assert reconfiguration in ["tasks", "instances"]
         self.M = M
         self.G = G
         self.E_cls = E_cls
-
-    def schedule(self, debug = False):
+        self.reconfiguration = reconfiguration
+
+    def schedule(self, debug = False, time_limit = None, workers = None, progress = None):
+        """
+        Solve the model, starting from a REFT schedule
+
+        Args:
+            debug (): print solver statistics
+            time_limit (): wall-clock budget of the solver in seconds, None for no limit
+            workers (): number of search workers, None for the solver default
+            progress (): called with a Progress for every improving solution
+
+        Returns:
+            (Schedule, edge schedule) of the best solution found, the REFT
+            schedule if the solver found none in time
+
+        Raises:
+            RuntimeError: if CP-SAT finds the model infeasible or invalid
+        """
+        build_start = time.time()
         self.model = cp_model.CpModel()
         M = self.M
         G = self.G
         model = self.model
 
-        InstanceVar = collections.namedtuple("Instance", "t_s cost t_f active interval pe location task ttype intcost")
-                                                            # ^^^^ only for NewOptionalIntervalVar
-        LinkInstanceVar = collections.namedtuple("LinkInstance", "t_s cost t_f interval active")
-
-        horizon = 10000
+        # REFT gives a feasible schedule, its makespan bounds the optimum
+        (S_reft, E_reft) = reft.REFT(M, G, self.E_cls).schedule()
+        horizon = math.ceil(S_reft.length())
         instances = {}
-        config_active = {}
         edge_instances = {}
 
         tasks = [G.task(v) for v in G.sorted_topologically()]
+
+        # One start and finish per task, shared by all of its placements. The
+        # optional interval of the active placement ties them to its cost.
+        T_s = {task.index: model.NewIntVar(0, horizon, f"T_s_{task.index}") for task in tasks}
+        T_f = {task.index: model.NewIntVar(0, horizon, f"T_f_{task.index}") for task in tasks}
         for task in tasks:
-            for pe in M.PEs():
-                for l in M.locations():
-                    suffix = f"_{task.index}_{pe.index}_{l.index}"
-                    active = model.NewBoolVar(f"active{suffix}")
-                    t_s = model.NewIntVar(0, horizon, f"t_s{suffix}")
-                    intcost = G.task_cost(task, pe)
-                    cost = model.NewIntVar(intcost, intcost, f"cost{suffix}")
-                    t_f = model.NewIntVar(0, horizon, f"t_f{suffix}")
-                    interval = model.NewOptionalIntervalVar(t_s, cost, t_f, active, f"active{suffix}")
-
-                    # Ensure t(v) == P_P^t(pe)
-                    if task.type is not None and task.type != pe.type:
-                        model.Add(active == False)
-
-                    instances[(pe.index, l.index, task.index)] = InstanceVar(active=active, t_s=t_s, cost=cost, t_f=t_f, interval=interval, pe=pe, location=l, task=task, ttype=task.type, intcost=intcost)
+            # Only placements with t(v) == P_P^t(pe) get variables
+            for (pe, l) in M.placements(task.type):
+                suffix = f"_{task.index}_{pe.index}_{l.index}"
+                active = model.NewBoolVar(f"active{suffix}")
+                intcost = G.task_cost(task, pe)
+                interval = model.NewOptionalIntervalVar(T_s[task.index], intcost, T_f[task.index], active, f"active{suffix}")
+
+                instances[(pe.index, l.index, task.index)] = InstanceVar(active=active, t_s=T_s[task.index], cost=intcost, t_f=T_f[task.index], interval=interval, pe=pe, location=l, task=task, ttype=task.type, intcost=intcost)
 
         # Execute each task on exactly one placed PE
         for task in tasks:
-            model.AddExactlyOne(instances[(pe.index, l.index, task.index)].active for pe in M.PEs() for l in M.locations())
+            model.AddExactlyOne(instances[(pe.index, l.index, task.index)].active for (pe, l) in M.placements(task.type))
 
         # Ensure non-overlap of different configurations on a location
-        for (lhs_key, rhs_key) in list(combinations(instances.keys(), 2)):
+        if self.reconfiguration == "tasks":
+            self.add_task_reconfiguration(instances, T_s, T_f)
+        else:
+            self.add_instance_reconfiguration(instances)
+
+        for task in tasks:
+            for dependency in G.task_dependencies(task):
+                model.Add(T_f[dependency.index] <= T_s[task.index])
+                if self.E_cls == schedule.EdgeSchedule:
+                    self.add_transfers(instances, edge_instances, dependency, task, T_s, T_f, horizon)
+
+        # No overlap
+        for pe in M.PEs():
+            for l in M.locations():
+                placed = [instances.get((pe.index, l.index, task.index)) for task in tasks]
+                model.AddNoOverlap(i.interval for i in placed if i is not None and i.intcost > 0)
+
+        link_instances = collections.defaultdict(list)
+        for k, i in edge_instances.items():
+            link_instances[k[6]].append(i)
+        for link in self.M.topology.links():
+            model.AddNoOverlap(i.interval for i in link_instances[link])
+
+
+        obj_var = model.NewIntVar(0, horizon, 'makespan')
+        model.AddMaxEquality(obj_var, list(T_f.values()))
+        model.Minimize(obj_var)
+
+        self.add_hint(S_reft, instances, obj_var)
+
+        solver = cp_model.CpSolver()
+        if time_limit is not None:
+            solver.parameters.max_time_in_seconds = time_limit
+        if workers is not None:
+            solver.parameters.num_workers = workers
+        schedule_builder = ScheduleBuilder(G, M, instances, edge_instances, self.E_cls, progress)
+
+        self.build_time = time.time() - build_start
+        solve_start = time.time()
+        self.status = solver.Solve(model, schedule_builder)
+        self.solve_time = time.time() - solve_start
+        if debug:
+            print('\nStatistics')
+            print('  - conflicts      : %i' % solver.NumConflicts())
+            print('  - branches       : %i' % solver.NumBranches())
+            print('  - wall time      : %f s' % solver.WallTime())
+            print('  - solutions found: %i' % schedule_builder.solution_count)
+            print('  - best bound     : %i' % solver.BestObjectiveBound())
+            print('  - cp len         : %i' % G.cp_len())
+
+            if schedule_builder.solution_count > 0:
+                print(schedule_builder.min_schedule())
+
+        if self.status == cp_model.UNKNOWN:
+            # Out of time before the first solution
+            return (S_reft, E_reft)
+        if self.status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            # The REFT schedule is a solution of the model, so this is a modelling error
+            raise RuntimeError(f"CP-SAT returned {solver.StatusName(self.status)}")
+        return schedule_builder.min_schedule()
+
+    def add_transfers(self, instances, edge_instances, dependency, task, T_s, T_f, horizon):
+        """
+        Link intervals for the data of one edge
+
+        The transfer has a single finish time per edge, as only one pair of
+        placements can be active. Each pair with a non-empty path and a
+        non-zero cost gets an optional interval per link of its path, which
+        ends at that finish time.
+
+        Args:
+            instances (): InstanceVar by (pe, location, task)
+            edge_instances (): LinkInstanceVar by (src pe, src location, dst pe, dst location, src task, dst task, link), extended in place
+            dependency (): source Task of the edge
+            task (): destination Task of the edge
+            T_s (): start variable by task index
+            T_f (): finish variable by task index
+            horizon (): upper bound of all times
+        """
+        model = self.model
+        M = self.M
+
+        edge_cost = self.G.edge_cost(dependency, task)
+        if edge_cost == 0:
+            return
+
+        t_f = model.NewIntVar(0, horizon, f"transfer_t_f_{dependency.index}_{task.index}")
+        model.Add(t_f <= T_s[task.index])
+        for (src_pe, src_l) in M.placements(dependency.type):
+            for (dst_pe, dst_l) in M.placements(task.type):
+                path = M.topology.pe_path((src_pe.index, src_l.index), (dst_pe.index, dst_l.index))
+                if len(path) == 0:
+                    continue
+
+                src_active = instances[(src_pe.index, src_l.index, dependency.index)].active
+                dst_active = instances[(dst_pe.index, dst_l.index, task.index)].active
+                edge_active = model.NewBoolVar(f"transfer_active_{(src_pe.index, src_l.index, dst_pe.index, dst_l.index, dependency.index, task.index)}")
+                model.AddImplication(edge_active, src_active)
+                model.AddImplication(edge_active, dst_active)
+                model.AddBoolOr([src_active.Not(), dst_active.Not(), edge_active])
+                model.Add(t_f > T_f[dependency.index]).OnlyEnforceIf(edge_active)
+
+                for link in path:
+                    key = (src_pe.index, src_l.index, dst_pe.index, dst_l.index, dependency.index, task.index, link)
+                    cost = int(edge_cost / M.topology.relative_capacity(link))
+                    t_s = t_f - cost
+                    model.Add(t_s >= T_f[dependency.index]).OnlyEnforceIf(edge_active)
+                    interval = model.NewOptionalIntervalVar(t_s, cost, t_f, edge_active, f"interval_{key}")
+                    assert(key not in edge_instances)
+                    edge_instances[key] = LinkInstanceVar(t_s=t_s, cost=cost, t_f=t_f, interval=interval, active=edge_active)
+
+    def add_hint(self, S, instances, obj_var):
+        """
+        Start the search from an existing schedule
+
+        Each task gets the placement and times of its scheduled instance.
+
+        Args:
+            S (): Schedule of the same G and M
+            instances (): InstanceVar by (pe, location, task)
+            obj_var (): makespan variable
+        """
+        hinted = set()
+        for (pe_index, l_index, task_index), i in instances.items():
+            scheduled = S.instance(i.task)
+            self.model.AddHint(i.active, scheduled.placed_pe() == (pe_index, l_index))
+            # The start and finish are shared by all placements of a task
+            if task_index not in hinted:
+                # Rounding up keeps the order of all times and the integer task costs
+                self.model.AddHint(i.t_s, math.ceil(scheduled.interval.lower))
+                self.model.AddHint(i.t_f, math.ceil(scheduled.interval.upper))
+                hinted.add(task_index)
+        self.model.AddHint(obj_var, math.ceil(S.length()))
+
+    def add_task_reconfiguration(self, instances, T_s, T_f):
+        """
+        Separate every pair of tasks with different configurations on a location
+
+        A task is on a (location, configuration) if one of its placements
+        there is active. One Bool orders each pair of tasks, shared by all
+        locations and configurations, and the overhead r is enforced if both
+        tasks are on the same location with different configurations. This
+        is the same model as add_instance_reconfiguration(), but the number
+        of Bools is O(T²) instead of O((T·P·L)²) and the constraints no
+        longer grow with the PEs of a configuration.
+
+        Args:
+            instances (): InstanceVar by (pe, location, task)
+            T_s (): start of each task
+            T_f (): finish of each task
+        """
+        model = self.model
+        M = self.M
+
+        configured = collections.defaultdict(list) # (task index, location, configuration) -> active Bools
+        for i in instances.values():
+            if i.intcost > 0:
+                configured[(i.task.index, i.location.index, i.pe.configuration.index)].append(i.active)
+
+        on = collections.defaultdict(list) # location -> (task index, configuration, Bool)
+        for ((v, l_id, c_id), literals) in configured.items():
+            if len(literals) == 1:
+                on[l_id].append((v, c_id, literals[0]))
+            else:
+                literal = model.NewBoolVar(f"on_{v}_{l_id}_{c_id}")
+                model.Add(sum(literals) == literal)
+                on[l_id].append((v, c_id, literal))
+
+        order = {}
+        for l_id, occupants in on.items():
+            overhead = M.properties[M.location(l_id)].get("r", 0)
+            for k, (v_a, c_a, lit_a) in enumerate(occupants):
+                for (v_b, c_b, lit_b) in occupants[k + 1:]:
+                    if c_a == c_b or v_a == v_b:
+                        continue
+                    key = (min(v_a, v_b), max(v_a, v_b))
+                    if key not in order:
+                        order[key] = model.NewBoolVar(f"before_{key}")
+                    before = order[key] if v_a < v_b else order[key].Not()
+                    model.Add(T_f[v_a] + overhead <= T_s[v_b]).OnlyEnforceIf([before, lit_a, lit_b])
+                    model.Add(T_f[v_b] + overhead <= T_s[v_a]).OnlyEnforceIf([before.Not(), lit_a, lit_b])
+
+    def add_instance_reconfiguration(self, instances):
+        """ Separate every pair of instances with different configurations on a location, O((T·P·L)²) """
+        model = self.model
+        M = self.M
+
+        for (lhs_key, rhs_key) in combinations(instances.keys(), 2):
             (l_pe, l_l, l_t) = lhs_key
             (r_pe, r_l, r_t) = rhs_key
             lhs = instances[lhs_key]
@@ -80,116 +298,66 @@ class OptimalScheduler:
                         # https://github.com/google/or-tools/blob/stable/ortools/sat/docs/channeling.md#if-then-else-expressions
                         #
                         # Important: make sure that both lhs and rhs are active, the OptionalInterval logic does not work here automatically...
-                        model.Add(lhs.t_f + overhead <= rhs.t_s).OnlyEnforceIf(lhs_before).OnlyEnforceIf(lhs.active).OnlyEnforceIf(rhs.active)
-                        model.Add(rhs.t_f + overhead <= lhs.t_s).OnlyEnforceIf(lhs_before.Not()).OnlyEnforceIf(lhs.active).OnlyEnforceIf(rhs.active)
-
-
-
-
-        for task in tasks:
-            for dependency in G.task_dependencies(task):
-                for src_pe in M.PEs():
-                    for src_l in M.locations():
-                        for dst_pe in M.PEs():
-                            for dst_l in M.locations():
-                                model.Add(instances[(src_pe.index, src_l.index, dependency.index)].t_f <= instances[(dst_pe.index, dst_l.index, task.index)].t_s)
-                                if self.E_cls == schedule.EdgeSchedule:
-                                    path = self.M.topology.pe_path((src_pe.index, src_l.index), (dst_pe.index, dst_l.index))
-                                    src_active = instances[(src_pe.index, src_l.index, dependency.index)].active
-                                    dst_active = instances[(dst_pe.index, dst_l.index, task.index)].active
-                                    edge_active = model.NewBoolVar("active")
-                                    model.Add(edge_active == True).OnlyEnforceIf(src_active).OnlyEnforceIf(dst_active)
-                                    model.Add(edge_active == False).OnlyEnforceIf(src_active.Not())
-                                    model.Add(edge_active == False).OnlyEnforceIf(dst_active.Not())
-                                    edge_cost = G.edge_cost(dependency, task)
-                                    t_f = model.NewIntVar(0, horizon, f"t_f{suffix}")
-                                    for link in path:
-                                        link_id = link
-                                        suffix = f"_{(src_pe.index, src_l.index, dst_pe.index, dst_l.index, dependency.index, task.index, link_id)}"
-                                        t_s = model.NewIntVar(0, horizon, f"t_s{suffix}")
-                                        cost_val = int(edge_cost / self.M.topology.relative_capacity(link))
-                                        cost = model.NewIntVar(cost_val, cost_val, f"cost{suffix}")
-                                        model.Add(t_s >= instances[(src_pe.index, src_l.index, dependency.index)].t_f).OnlyEnforceIf(edge_active)
-                                        model.Add(t_f > instances[(src_pe.index, src_l.index, dependency.index)].t_f).OnlyEnforceIf(edge_active)
-                                        model.Add(t_s < instances[(dst_pe.index, dst_l.index, task.index)].t_s).OnlyEnforceIf(edge_active)
-                                        model.Add(t_f <= instances[(dst_pe.index, dst_l.index, task.index)].t_s).OnlyEnforceIf(edge_active)
-                                        interval = model.NewOptionalIntervalVar(t_s, cost, t_f, edge_active, f"interval{suffix}")
-                                        instance = LinkInstanceVar(t_s=t_s, cost=cost, t_f=t_f, interval=interval, active=edge_active)
-                                        assert((src_pe.index, src_l.index, dst_pe.index, dst_l.index, dependency.index, task.index, link_id) not in edge_instances)
-                                        edge_instances[(src_pe.index, src_l.index, dst_pe.index, dst_l.index, dependency.index, task.index, link_id)] = instance
-
-        # No overlap
-        for pe in M.PEs():
-            for l in M.locations():
-                model.AddNoOverlap(instances[(pe.index, l.index, task.index)].interval for task in tasks if instances[(pe.index, l.index, task.index)].intcost > 0)
-
-        for link in self.M.topology.g.edges():
-            link_instances = [edge_instances[k] for k in edge_instances.keys() if k[6] == link]
-            model.AddNoOverlap(i.interval for i in link_instances)
-
-
-        obj_var = model.NewIntVar(0, horizon, 'makespan')
-        model.AddMaxEquality(obj_var, [i.t_f for k, i in instances.items()])
-        model.Minimize(obj_var)
+                        model.Add(lhs.t_f + overhead <= rhs.t_s).OnlyEnforceIf([lhs_before, lhs.active, rhs.active])
+                        model.Add(rhs.t_f + overhead <= lhs.t_s).OnlyEnforceIf([lhs_before.Not(), lhs.active, rhs.active])
 
-        solver = cp_model.CpSolver()
-        schedule_builder = ScheduleBuilder(G, M, instances, edge_instances, self.E_cls)
-
-        solver.Solve(model, schedule_builder)
-        if debug:
-            print('\nStatistics')
-            print('  - conflicts      : %i' % solver.NumConflicts())
-            print('  - branches       : %i' % solver.NumBranches())
-            print('  - wall time      : %f s' % solver.WallTime())
-            print('  - solutions found: %i' % schedule_builder.solution_count)
-            print('  - best solution  : %i' % schedule_builder.BestObjectiveBound())
-            print('  - cp len         : %i' % G.cp_len())
 
-            print(schedule_builder.min_schedule())
-
-        return schedule_builder.min_schedule()
+class ScheduleBuilder(cp_model.CpSolverSolutionCallback):
+    """ Keeps the values of the incumbent and builds its schedule on demand
 
+        CP-SAT only reports improving solutions, so only the latest one is
+        kept and memory stays flat over long runs.
+    """
 
-class ScheduleBuilder(cp_model.CpSolverSolutionCallback):
-    def __init__(self, G, M, instances, edge_instances, E_cls):
+    def __init__(self, G, M, instances, edge_instances, E_cls, progress = None):
         cp_model.CpSolverSolutionCallback.__init__(self)
-        self.S = schedule.Schedule()
         self.solution_count = 0
         self.G = G
         self.M = M
         self.instances = instances
         self.edge_instances = edge_instances
-        self.Ss = []
-        self.Es = []
         self.E_cls = E_cls
+        self.progress = progress
+        self.incumbent = None # (placed instances, transfers) as (key, t_s, t_f)
 
     def on_solution_callback(self):
         self.solution_count += 1
 
-        S = schedule.Schedule()
-        E = self.E_cls(self.G, self.M)
+        placed = []
         for k, i in self.instances.items():
             if self.Value(i.active):
-                t_s = self.Value(i.t_s)
-                t_f = self.Value(i.t_f)
-                if t_s == t_f:
-                    interval = po.singleton(t_s)
-                else:
-                    interval = po.closedopen(t_s, t_f)
-                instance = schedule.Instance(i.task, i.pe, i.location, interval)
-                scheduled_task = task.ScheduledTask(i.task, instance)
-                S.add_task(scheduled_task)
+                placed.append((k, self.Value(i.t_s), self.Value(i.t_f)))
+        transfers = []
         for k, i in self.edge_instances.items():
             if self.Value(i.active):
                 (src_pe, src_l, dst_pe, dst_l, src_task_index, dst_task_index, link) = k
                 assert(self.Value(self.instances[(src_pe, src_l, src_task_index)].t_f) <= self.Value(i.t_s))
                 assert(self.Value(self.instances[(src_pe, src_l, src_task_index)].t_f) < self.Value(i.t_f))
-                interval = po.closedopen(self.Value(i.t_s), self.Value(i.t_f))
-                if not interval.empty:
-                    E.add_interval(link, interval, src_task_index, dst_task_index)
-        self.Ss.append(S)
-        self.Es.append(E)
+                transfers.append((k, self.Value(i.t_s), self.Value(i.t_f)))
+        self.incumbent = (placed, transfers)
+
+        if self.progress is not None:
+            objective = self.ObjectiveValue()
+            bound = self.BestObjectiveBound()
+            gap = (objective - bound) / objective if objective > 0 else 0.0
+            self.progress(Progress(wall=self.WallTime(), objective=objective, bound=bound, gap=gap))
 
     def min_schedule(self):
-        minpos = self.Ss.index(min(self.Ss, key = lambda s: s.length()))
-        return (self.Ss[minpos], self.Es[minpos])
+        """ Schedule and edge schedule of the incumbent """
+        (placed, transfers) = self.incumbent
+        S = schedule.Schedule()
+        E = self.E_cls(self.G, self.M)
+        for (k, t_s, t_f) in placed:
+            i = self.instances[k]
+            if t_s == t_f:
+                interval = po.singleton(t_s)
+            else:
+                interval = po.closedopen(t_s, t_f)
+            instance = schedule.Instance(i.task, i.pe, i.location, interval)
+            S.add_task(task.ScheduledTask(i.task, instance), exclusive = False)
+        for (k, t_s, t_f) in transfers:
+            (src_pe, src_l, dst_pe, dst_l, src_task_index, dst_task_index, link) = k
+            interval = po.closedopen(t_s, t_f)
+            if not interval.empty:
+                E.add_interval(link, interval, src_task_index, dst_task_index, exclusive = False)
+        return (S, E)
@@ -15,31 +15,23 @@ class REFT:
         sorted_tasks = self.G.sorted_by_urank()
 
         for task in sorted_tasks:
-            min = po.closedopen(0, po.inf)
-            min_p = None
-            min_l = None
-            for l in self.M.locations():
-                overhead = self.M.properties[l].get("r", 0)
-                for p in self.M.PEs():
-                    # print(task.index, self.M.properties[p]["t"], task.type)
-                    if "t" in self.M.properties[p] and self.M.properties[p]["t"] != task.type:
-                        continue
-                    earliest = po.closedopen(self.data_ready_time(task, p, l), po.inf)
-                    interval = self.S.EFT(task, p, l, earliest, overhead)
-                    if interval.upper < min.upper: # earliest finish time 8)
-                        min = interval
-                        min_p = p
-                        min_l = l
-
-            assert(min_p)
-            assert(min_l)
+            # Evaluate all placements at once
+            placements = self.M.placements(task.type)
+            arrays = self.M.placement_arrays(task.type)
+            dependencies = self.S.instances_for_tasks(self.G.dependencies(task))
+            ready = self.E.data_ready_times(dependencies, task, placements, arrays)
+            assert(len(placements) > 0)
+            (start, finish) = self.S.EFTs(task, placements, ready, arrays.overhead)
+
+            # earliest finish time 8), the first one on ties
+            k = int(finish.argmin())
+            (min_p, min_l) = placements[k]
+            min = po.singleton(start[k].item()) if start[k] == finish[k] else po.closedopen(start[k].item(), finish[k].item())
 
             # Do the allocation
-            dependencies = [int(i) for i in self.G.dependencies(task)]
             edge_intervals = []
-            for instance in self.S.instances:
-                if instance.task.index in dependencies:
-                    edge_intervals.append(self.E.allocate_path(instance, task, min_p, min_l))
+            for instance in dependencies:
+                edge_intervals.append(self.E.allocate_path(instance, task, min_p, min_l))
 
             overhead = self.M.properties[min_l].get("r", 0)
             real_DFT = max([i.upper for i in edge_intervals], default = min.lower)
@@ -54,12 +46,7 @@ class REFT:
         return (self.S, self.E)
 
     def data_ready_time(self, task, dst_PE, dst_loc):
-        dependencies = [int(i) for i in self.G.dependencies(task)]
-
-        instances = []
-        for instance in self.S.instances:
-            if instance.task.index in dependencies:
-                instances.append(instance)
+        instances = self.S.instances_for_tasks(self.G.dependencies(task))
 
         return max([self.E.edge_finish_time(i, task, dst_PE, dst_loc) for i in instances], default=0)
 
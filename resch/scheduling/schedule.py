@@ -1,9 +1,15 @@
-from itertools import chain, pairwise
+from itertools import chain
 from functools import reduce
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+import numpy as np
 import portion as po
 
+import resch.scheduling.timeline as timeline_m
+from resch.scheduling.timeline import Timeline
+
 class Instance:
+    __slots__ = ("config", "pe", "location", "interval", "task")
+
     def __init__(self, task, pe, location, interval):
         self.config = pe.configuration
         self.pe = pe
@@ -14,57 +20,149 @@ class Instance:
     def placed_pe(self):
         return (self.pe.index, self.location.index)
 
-class Schedule:
+ScheduleArrays = namedtuple("ScheduleArrays", "task t_s t_f pe location config")
+# kind is one of missing, precedence, pe, reconfiguration, link or transfer.
+# first and second are the tasks involved, the configurations for
+# reconfiguration or the (src, dst) edges for link. amount is the overlap or
+# the missing time between them.
+Violation = namedtuple("Violation", "kind resource first second amount")
+
+def overlapping(lower, upper, *resources):
+    """
+    Intervals that overlap their predecessor on the same resource
+
+    The intervals are sorted by resource and start, so every overlap shows
+    up between at least one pair of neighbours.
+
+    Args:
+        lower (): array of starts
+        upper (): array of ends
+        resources (): arrays that together identify the resource of each interval
+
+    Returns:
+        (previous, next) arrays of indices of the overlapping neighbours
+    """
+    order = np.lexsort((lower,) + resources[::-1])
+    (prev, succ) = (order[:-1], order[1:])
+    same = np.ones(len(prev), dtype=bool)
+    for resource in resources:
+        same &= resource[prev] == resource[succ]
+    found = same & (lower[succ] < upper[prev])
+    return (prev[found], succ[found])
+
+class Journaled:
+    """ Undo log for tentative changes, e.g. to evaluate a placement and revert it
+
+        Changes are only recorded between snapshot() and the matching
+        commit(), so regular scheduling does not pay for it. Snapshots can be
+        nested.
+    """
+
+    def __init__(self):
+        self.journal = None
+
+    def snapshot(self):
+        """ Token to roll back to """
+        if self.journal is None:
+            self.journal = []
+        return len(self.journal)
+
+    def rollback(self, token):
+        """ Undo all changes since the snapshot, newest first """
+        while len(self.journal) > token:
+            self.journal.pop()()
+
+    def commit(self, token):
+        """ Keep all changes since the snapshot """
+        if token == 0:
+            self.journal = None
+
+    def record(self, undo):
+        if self.journal is not None:
+            self.journal.append(undo)
+
+class Schedule(Journaled):
     def __init__(self):
+        super().__init__()
         self.tasks = []
         self.instances = []
-        self.A_p = defaultdict(lambda: po.IntervalDict()) # [p_id][interval] -> task_id
-        self.A_l = defaultdict(lambda: po.IntervalDict()) # [l_id][interval] -> config_id
-
-    def add_task(self, task):
+        self.task_index = {} # task_id -> ScheduledTask
+        self.instance_index = {} # task_id -> position in instances
+        self.A_p = defaultdict(Timeline) # [(p_id, l_id)] -> intervals of task_id
+        self.A_l = defaultdict(lambda: defaultdict(lambda: Timeline(merge = True))) # [l_id][config_id] -> occupied intervals
+
+    def add_task(self, task, exclusive = True):
+        """
+        Args:
+            task (): ScheduledTask
+            exclusive (): raise a ValueError if the task overlaps another on
+                its PE, otherwise keep it for violations(), e.g. when loading
+        """
         self.tasks.append(task)
-        self.add_instance(task)
+        self.task_index[task.index] = task
+        self.record(self.remove_last_task)
+        self.add_instance(task, exclusive)
+
+    def remove_last_task(self):
+        del self.task_index[self.tasks.pop().index]
 
     def length(self):
         return max([i.interval.upper for i in self.instances], default=0)
 
     def task(self, v):
-        return next(iter([t for t in self.tasks if t.index == v]), None)
+        return self.task_index.get(int(v))
 
     def EFT(self, task, p, loc, earliest, overhead):
         assert(task.index is not None)
         assert(p.index is not None)
         assert(loc.index is not None)
 
-        if task.cost[p.original_index] == 0:
+        cost = task.cost[p.original_index]
+        if cost == 0:
             return po.singleton(earliest.lower)
 
-        available = earliest
-
-        # Remove other tasks on the same PE
-        available = available - self.A_p[(p.index, loc.index)].domain()
-
-        # Remove other instances on the same location with different configs
-        for c_interval, c_id in self.A_l[loc.index].items():
+        # Other tasks on the same PE and other configurations on the location,
+        # the latter including the reconfiguration overhead
+        timelines = [(self.A_p[(p.index, loc.index)], 0)]
+        for c_id, timeline in self.A_l[loc.index].items():
             if c_id != p.configuration.index:
-                available_pre = available
-                int_w_reconf = c_interval.apply(
-                        lambda x: x.replace(
-                            lower = lambda v: v - overhead,
-                            upper = lambda v: v + overhead))
-                available = available - int_w_reconf
-
-        for i in available:
-            # is the end still in the same slot?
-            if po.singleton(i.lower + task.cost[p.original_index]) <= i:
-                return po.closedopen(i.lower, i.lower + task.cost[p.original_index])
-
-        # Should never arrive here, since we're in [earliest, +inf)
-        assert(False)
-
-    def add_instance(self, task):
+                timelines.append((timeline, overhead))
+
+        t_s = timeline_m.earliest(timelines, earliest.lower, cost)
+        return po.closedopen(t_s, t_s + cost)
+
+    def EFTs(self, task, placements, ready, overhead):
+        """
+        Earliest start and finish of a task on many placements at once
+
+        Same as EFT() for each placement, without building intervals.
+
+        Args:
+            task (): Task to place
+            placements (): list of (PE, Location)
+            ready (): array of the earliest start on each placement
+            overhead (): array of the reconfiguration overhead of each placement
+
+        Returns:
+            (start, finish) arrays
+        """
+        cost = task.cost[[p.original_index for (p, _) in placements]]
+        start = np.array(ready, dtype=np.result_type(ready, cost, overhead), copy=True)
+        for k in np.flatnonzero(cost):
+            (p, loc) = placements[k]
+            timelines = [(self.A_p[(p.index, loc.index)], 0)]
+            for c_id, timeline in self.A_l[loc.index].items():
+                if c_id != p.configuration.index:
+                    timelines.append((timeline, overhead[k]))
+            start[k] = timeline_m.earliest(timelines, start[k], cost[k])
+        return (start, start + cost)
+
+    def add_instance(self, task, exclusive = True):
         instance = task.instance
+        assert task.index not in self.instance_index, f"Task {task.index} is already scheduled"
+        self.instance_index[task.index] = len(self.instances)
         self.instances.append(instance)
+        self.record(self.remove_last_instance)
         p_id = instance.pe.index
         c_id = instance.pe.configuration.index
         l_id = instance.location.index
@@ -73,58 +171,134 @@ class Schedule:
         if instance.interval.lower == instance.interval.upper:
             return
 
-        # Ensure sure that the PE is not executing any other task
-        assert not self.A_p[(p_id, l_id)].domain().overlaps(instance.interval),\
-             f"{self.A_p[(p_id, l_id)]} and {instance.interval} overlap"
+        lower = instance.interval.lower
+        upper = instance.interval.upper
 
-        self.A_p[(p_id, l_id)][instance.interval] = t_id
+        # Ensure sure that the PE is not executing any other task, the
+        # timeline raises otherwise. A non-exclusive instance that overlaps
+        # is only kept in instances.
+        if exclusive or not self.A_p[(p_id, l_id)].overlaps(lower, upper):
+            self.add_interval(self.A_p[(p_id, l_id)], lower, upper, t_id)
         # Overlap is allowed if c_id is the same
-        self.A_l[l_id][instance.interval] = c_id
+        self.add_interval(self.A_l[l_id][c_id], lower, upper, c_id)
+
+    def add_interval(self, timeline, lower, upper, value):
+        undo = timeline.add(lower, upper, value)
+        if undo is not None:
+            self.record(lambda: timeline.restore(undo))
+
+    def remove_last_instance(self):
+        del self.instance_index[self.instances.pop().task.index]
 
     def instances_for_tasks(self, tasks):
-        int_tasks = [int(t) for t in tasks]
-        return [i for i in self.instances if i.task.index in int_tasks]
+        """ Instances of the scheduled tasks among tasks, in the order they were scheduled """
+        positions = sorted(self.instance_index[t] for t in map(int, tasks) if t in self.instance_index)
+        return [self.instances[i] for i in positions]
 
     def instance(self, task):
-        instance = [i for i in self.instances if i.task.index == task.index]
-        assert len(instance) == 1
-        return instance[0]
-
-    def validate(self, G, M):
-        for task in G.tasks():
-            t_instance = self.instance(task)
-            for dep in G.task_dependencies(task):
-                dep_instance = self.instance(dep)
-                if dep_instance.interval.lower != dep_instance.interval.upper:
-                    assert t_instance.interval > self.instance(dep).interval, f"{t_instance.interval} should come after {self.instance(dep).interval}"
-
+        assert task.index in self.instance_index
+        return self.instances[self.instance_index[task.index]]
+
+    def arrays(self):
+        """
+        Placement of all scheduled tasks as arrays, sorted by task index
+
+        Returns:
+            ScheduleArrays of task index, start, finish, PE, location and configuration index
+        """
+        order = sorted(self.instance_index)
+        instances = [self.instances[self.instance_index[t]] for t in order]
+        return ScheduleArrays(
+            np.array(order, dtype=int),
+            np.array([i.interval.lower for i in instances], dtype=float),
+            np.array([i.interval.upper for i in instances], dtype=float),
+            np.array([i.pe.index for i in instances], dtype=int),
+            np.array([i.location.index for i in instances], dtype=int),
+            np.array([i.config.index for i in instances], dtype=int))
+
+    def violations(self, G, M, E = None):
+        """
+        Check the whole schedule at once and collect everything that is wrong
+
+        Args:
+            G (): TaskGraph that was scheduled
+            M (): machine model
+            E (): optional edge schedule whose links are checked as well
+
+        Returns:
+            List of Violation, empty for a valid schedule
+        """
+        A = self.arrays()
+        found = []
+
+        # Row of each task in A or -1 if it was not scheduled
+        row = np.full(max(G.num_nodes(), A.task.max(initial=-1) + 1), -1)
+        row[A.task] = np.arange(len(A.task))
+        for v in np.flatnonzero(row[:G.num_nodes()] < 0):
+            found.append(Violation("missing", int(v), int(v), None, None))
+
+        # Tasks start after their (non-empty) dependencies have finished
+        src, dst, _ = G.c.edges()
+        (r_src, r_dst) = (row[src], row[dst])
+        scheduled = (r_src >= 0) & (r_dst >= 0)
+        (r_src, r_dst) = (r_src[scheduled], r_dst[scheduled])
+        late = (A.t_s[r_src] != A.t_f[r_src]) & (A.t_s[r_dst] < A.t_f[r_src])
+        for (f, t) in zip(r_src[late], r_dst[late]):
+            found.append(Violation("precedence", (int(A.task[f]), int(A.task[t])), int(A.task[f]), int(A.task[t]), float(A.t_f[f] - A.t_s[t])))
+
+        # A PE executes one task at a time
+        busy = np.flatnonzero(A.t_s != A.t_f)
+        (prev, succ) = overlapping(A.t_s[busy], A.t_f[busy], A.pe[busy], A.location[busy])
+        for (f, t) in zip(busy[prev], busy[succ]):
+            found.append(Violation("pe", (int(A.pe[f]), int(A.location[f])), int(A.task[f]), int(A.task[t]), float(A.t_f[f] - A.t_s[t])))
+
+        # The intervals of one configuration are merged, so neighbours with
+        # different configurations need to be r apart
         for loc in M.locations():
             overhead = M.properties[loc].get("r", 0)
-            for lhs, rhs in pairwise(self.A_l[loc.index]):
-                lhs_with_overhead = lhs.apply(lambda x: x.replace(upper = lambda v: v + overhead, lower=lambda v: v - overhead) if x.lower != x.upper else x)
-                assert (lhs_with_overhead & rhs).empty,\
-                    f"{lhs} to {rhs} requires {overhead} overhead ({lhs_with_overhead & rhs})"
-
-
-    def to_csv(self, file_handle):
-        rows = ["config,pe,location,t_s,t_f,task\n"]
-        for i in self.instances:
-            rows.append(f"{i.config.index},{i.pe.index},{i.location.index},{i.interval.lower},{i.interval.upper},{i.task.index}\n")
-
-        file_handle.writelines(rows)
+            occupied = [(lower, upper, c_id) for c_id, timeline in self.A_l[loc.index].items() for (lower, upper, _) in timeline]
+            if len(occupied) < 2:
+                continue
+            (lower, upper, config) = (np.array(x) for x in zip(*occupied))
+            order = np.argsort(lower, kind="stable")
+            (lower, upper, config) = (lower[order], upper[order], config[order])
+            gap = lower[1:] - upper[:-1]
+            reconfigured = (config[1:] != config[:-1]) & (gap < overhead)
+            for i in np.flatnonzero(reconfigured):
+                found.append(Violation("reconfiguration", loc.index, int(config[i]), int(config[i + 1]), float(overhead - gap[i])))
+
+        if E is not None:
+            found.extend(E.violations(A, row))
+
+        return found
+
+    def validate(self, G, M, E = None):
+        violations = self.violations(G, M, E)
+        assert not violations, f"{len(violations)} violations, e.g. {violations[:5]}"
+
+    def to_csv(self, file_handle, chunk_size = 65536):
+        """ Write all instances, chunk_size rows at a time """
+        file_handle.write("config,pe,location,t_s,t_f,task\n")
+        for start in range(0, len(self.instances), chunk_size):
+            file_handle.writelines(
+                f"{i.config.index},{i.pe.index},{i.location.index},{i.interval.lower},{i.interval.upper},{i.task.index}\n"
+                for i in self.instances[start:start + chunk_size])
 
     def __str__(self):
         ret = ""
-        for loc, interval in self.A_l.items():
-            ret += f"Location {loc}\n\t{interval}\n"
+        for loc, timelines in self.A_l.items():
+            ret += f"Location {loc}\n"
+            for c_id, timeline in timelines.items():
+                ret += f"\tConfiguration {c_id}: {timeline}\n"
 
         for pe, interval in self.A_p.items():
             ret += f"PE {pe}\n\t{interval}\n"
 
         return ret
 
-class NoEdgeSchedule:
+class NoEdgeSchedule(Journaled):
     def __init__(self, G, M):
+        super().__init__()
         self.G = G
         self.topo = M.topology
 
@@ -144,15 +318,45 @@ class NoEdgeSchedule:
     def allocate_path(self, instance, *arg):
         return po.singleton(instance.interval.upper)
 
-    def add_interval(self, *arg):
+    def data_ready_times(self, instances, dst_task, placements, arrays):
+        """
+        edge_finish_time() of all instances for each placement at once
+
+        Args:
+            instances (): scheduled instances of the dependencies
+            dst_task (): Task to place
+            placements (): list of (PE, Location)
+            arrays (): PlacementArrays of the placements
+
+        Returns:
+            Array with the data ready time of each placement
+        """
+        if not instances:
+            return np.zeros(len(placements), dtype=int)
+
+        finish = np.array([i.interval.upper for i in instances])
+        cost = self.G.c.lookup([i.task.index for i in instances], np.full(len(instances), dst_task.index))
+        pe = np.array([i.pe.index for i in instances])
+        location = np.array([i.location.index for i in instances])
+
+        # The edge cost is only paid if the dependency ran on another placement
+        local = (arrays.pe[:, None] == pe) & (arrays.location[:, None] == location)
+        return np.where(local, finish, finish + cost).max(axis=1)
+
+    def violations(self, A, row):
+        return []
+
+    def add_interval(self, *arg, **kwargs):
         pass
 
     def __str__(self):
         return "No edge schedule"
 
-class EdgeSchedule:
+class EdgeSchedule(Journaled):
     def __init__(self, G, M):
-        self.A_l = defaultdict(lambda: po.IntervalDict()) # link -> intervals
+        super().__init__()
+        self.A_l = defaultdict(Timeline) # link id -> intervals of (src task, dst task)
+        self.overlapping = [] # (link id, lower, upper, (src task, dst task)) kept out of A_l, see add_interval()
         self.G = G
         self.topo = M.topology
 
@@ -168,31 +372,31 @@ class EdgeSchedule:
         if cost == 0:
             return t_f
 
-        path = self.topo.pe_path(src_instance.placed_pe(), (dst_PE.index, dst_loc.index))
+        placed = (src_instance.placed_pe(), (dst_PE.index, dst_loc.index))
+        path = self.topo.pe_path(*placed)
 
-        available_interval = self.available_path_interval(path, cost, t_f)
+        available_interval = self.available_path_interval(path, cost, t_f, self.topo.min_capacity(*placed))
 
         return available_interval.upper
 
+    def data_ready_times(self, instances, dst_task, placements, arrays):
+        """ edge_finish_time() for each placement, the links make this sequential """
+        return np.array([max((self.edge_finish_time(i, dst_task, p, l) for i in instances), default=0) for (p, l) in placements])
 
-    def available_path_interval(self, path, cost, lower_bound):
-        available = po.closedopen(lower_bound, po.inf)
-        min_capacity = min(self.topo.relative_capacity(link) for link in path)
-        for link in path:
-            available = available - self.A_l[link].domain()
 
-        max_link_cost = cost / min_capacity
+    def available_path_interval(self, path, cost, lower_bound, min_capacity = None):
+        if min_capacity is None:
+            min_capacity = min(self.topo.relative_capacity(link) for link in path)
 
-        upper = lower_bound
-        for interval in available:
-            if po.singleton(interval.lower + max_link_cost) <= interval:
-                 upper = interval.lower + max_link_cost
-                 return po.closedopen(interval.lower, interval.lower + max_link_cost)
+        max_link_cost = cost / min_capacity
 
-        assert(False)
+        # Earliest window that is free on all links of the path
+        t_s = timeline_m.earliest([(self.A_l[link], 0) for link in path], lower_bound, max_link_cost)
+        return po.closedopen(t_s, t_s + max_link_cost)
 
     def allocate_path(self, src_instance, dst_task, dst_PE, dst_loc):
-        path = self.topo.pe_path(src_instance.placed_pe(), (dst_PE.index, dst_loc.index))
+        placed = (src_instance.placed_pe(), (dst_PE.index, dst_loc.index))
+        path = self.topo.pe_path(*placed)
         if len(path) == 0:
             return po.singleton(src_instance.interval.upper)
 
@@ -202,7 +406,7 @@ class EdgeSchedule:
         if cost == 0:
             return po.singleton(src_instance.interval.upper)
 
-        interval = self.available_path_interval(path, cost, lower_bound)
+        interval = self.available_path_interval(path, cost, lower_bound, self.topo.min_capacity(*placed))
 
         for link in path:
             self.allocate_edge(link, src_instance, dst_task, cost, interval)
@@ -214,21 +418,77 @@ class EdgeSchedule:
             return
         link_cost = cost / self.topo.relative_capacity(link)
         link_interval = po.closedopen(interval.upper - link_cost, interval.upper)
-        assert(not self.A_l[link].domain().overlaps(interval))
-        self.A_l[link][interval] = (src_instance.task.index, dst_task.index)
-
-    def add_interval(self, link, interval, src_task_index, dst_task_index):
-        self.A_l[link][interval] = (src_task_index, dst_task_index)
+        assert(not self.A_l[link].overlaps(interval.lower, interval.upper))
+        self.add_interval(link, interval, src_instance.task.index, dst_task.index)
+
+    def add_interval(self, link, interval, src_task_index, dst_task_index, exclusive = True):
+        """
+        Occupy a link with a transfer
+
+        Args:
+            link (): link id
+            interval (): interval of the transfer
+            src_task_index (): task that sends the data
+            dst_task_index (): task that receives the data
+            exclusive (): raise a ValueError if the transfer overlaps another
+                on the link, otherwise keep it for violations(), e.g. when loading
+        """
+        timeline = self.A_l[link]
+        if not exclusive and timeline.overlaps(interval.lower, interval.upper):
+            self.overlapping.append((link, interval.lower, interval.upper, (src_task_index, dst_task_index)))
+            self.record(self.overlapping.pop)
+            return
+        undo = timeline.add(interval.lower, interval.upper, (src_task_index, dst_task_index))
+        if undo is not None:
+            self.record(lambda: timeline.restore(undo))
+
+    def transfers(self):
+        """ All transfers as (link id, lower, upper, (src task, dst task)), including overlapping ones """
+        return chain(((link, lower, upper, edge) for link, timeline in self.A_l.items() for (lower, upper, edge) in timeline), self.overlapping)
+
+    def violations(self, A, row):
+        """
+        Transfers that overlap on a link, and transfers that start before
+        their source task finishes or end after their destination task starts
+
+        Args:
+            A (): ScheduleArrays of the schedule
+            row (): row of each task in A or -1 if it was not scheduled
+
+        Returns:
+            List of Violation
+        """
+        transfers = list(self.transfers())
+        if not transfers:
+            return []
+
+        (link, lower, upper) = (np.array(x) for x in list(zip(*transfers))[:3])
+        (src, dst) = (np.array(x) for x in zip(*(edge for (_, _, _, edge) in transfers)))
+        found = []
+
+        # A link carries one transfer at a time
+        (prev, succ) = overlapping(lower, upper, link)
+        for (f, t) in zip(prev, succ):
+            found.append(Violation("link", int(link[f]), (int(src[f]), int(dst[f])), (int(src[t]), int(dst[t])), float(upper[f] - lower[t])))
+
+        # A transfer occupies every link of its path with the same interval,
+        # check it against its tasks once
+        (lower, upper, src, dst) = (np.array(x) for x in zip(*sorted(set(zip(lower, upper, src, dst)))))
+        (r_src, r_dst) = (row[src], row[dst])
+        scheduled = (r_src >= 0) & (r_dst >= 0)
+        (lower, upper, src, dst, r_src, r_dst) = (x[scheduled] for x in (lower, upper, src, dst, r_src, r_dst))
+        amount = np.maximum(A.t_f[r_src] - lower, upper - A.t_s[r_dst])
+        found.extend(Violation("transfer", (int(s), int(d)), int(s), int(d), float(a))
+                     for (s, d, a) in zip(src[amount > 0], dst[amount > 0], amount[amount > 0]))
+        return found
 
 
     def to_csv(self, file_handle):
-        rows = ["t_s,t_f,link,from,to\n"]
-        links = sorted(self.A_l.keys())
-        for link in links:
-            for interval, edge in self.A_l[link].items():
-                link_id = f"{link.source()}-{link.target()}"
-                rows.append(f"{interval.lower},{interval.upper},{link_id},{edge[0]},{edge[1]}\n")
-        file_handle.writelines(rows)
+        """ Write all transfers, one link at a time """
+        file_handle.write("t_s,t_f,link,from,to\n")
+        for (link, lower, upper, edge) in sorted(self.transfers(), key=lambda t: t[0]):
+            link_id = "{}-{}".format(*self.topo.link_endpoints(link))
+            file_handle.write(f"{lower},{upper},{link_id},{edge[0]},{edge[1]}\n")
 
 
     def __str__(self):
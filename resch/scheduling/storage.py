@@ -0,0 +1,172 @@
+import numpy as np
+import portion as po
+from os import makedirs
+from os.path import join
+
+import resch.scheduling.schedule as schedule
+import resch.scheduling.task as task_m
+
+# One row per instance, same columns as Schedule.to_csv
+instance_dtype = np.dtype([("config", np.int64), ("pe", np.int64), ("location", np.int64), ("t_s", np.float64), ("t_f", np.float64), ("task", np.int64)])
+# One row per transfer on a link, the link is given by its source and target vertex in the topology
+transfer_dtype = np.dtype([("t_s", np.float64), ("t_f", np.float64), ("link_src", np.int64), ("link_dst", np.int64), ("from", np.int64), ("to", np.int64)])
+
+def instance_records(S):
+    """ All instances of a Schedule as a structured array, in scheduling order """
+    records = np.empty(len(S.instances), dtype=instance_dtype)
+    for name, column in [
+            ("config", (i.config.index for i in S.instances)),
+            ("pe", (i.pe.index for i in S.instances)),
+            ("location", (i.location.index for i in S.instances)),
+            ("t_s", (i.interval.lower for i in S.instances)),
+            ("t_f", (i.interval.upper for i in S.instances)),
+            ("task", (i.task.index for i in S.instances))]:
+        records[name] = np.fromiter(column, dtype=instance_dtype[name], count=len(records))
+    return records
+
+def transfer_records(E):
+    """ All link transfers of an edge schedule as a structured array, empty for NoEdgeSchedule """
+    rows = []
+    for (link, lower, upper, edge) in (E.transfers() if hasattr(E, "transfers") else []):
+        (src, dst) = E.topo.link_endpoints(link)
+        rows.append((lower, upper, src, dst, edge[0], edge[1]))
+    return np.array(rows, dtype=transfer_dtype)
+
+def schedule_from_records(records, G, M):
+    """ Rebuild a Schedule from instance records for the same G and M, overlaps are kept for Schedule.violations() """
+    S = schedule.Schedule()
+    locations = {l.index: l for l in M.locations()}
+    for row in records:
+        (t_s, t_f) = (row["t_s"].item(), row["t_f"].item())
+        interval = po.singleton(t_s) if t_s == t_f else po.closedopen(t_s, t_f)
+        task = G.task(int(row["task"]))
+        instance = schedule.Instance(task, M.get_pe(int(row["pe"])), locations[int(row["location"])], interval)
+        S.add_task(task_m.ScheduledTask(task, instance), exclusive = False)
+    return S
+
+def edge_schedule_from_records(records, G, M, E_cls = schedule.EdgeSchedule):
+    """ Rebuild an edge schedule from transfer records for the same G and M, overlaps are kept for violations() """
+    E = E_cls(G, M)
+    for row in records:
+        link = M.topology.link(int(row["link_src"]), int(row["link_dst"]))
+        E.add_interval(link, po.closedopen(row["t_s"].item(), row["t_f"].item()), int(row["from"]), int(row["to"]), exclusive = False)
+    return E
+
+def save_npz(path, S, E = None):
+    """
+
+    Save a schedule and optionally its edge schedule as one .npz file
+
+    Args:
+        path (): file to write to
+        S (): Schedule
+        E (): EdgeSchedule or NoEdgeSchedule
+    """
+    np.savez(path, instances=instance_records(S), transfers=transfer_records(E))
+
+def load_npz(path, G, M, E_cls = schedule.EdgeSchedule):
+    """
+
+    Load a schedule written by save_npz
+
+    Args:
+        path (): .npz file
+        G (): TaskGraph that was scheduled
+        M (): machine model the schedule was made for
+        E_cls (): edge schedule class to rebuild the transfers into
+
+    Returns:
+        (Schedule, edge schedule)
+    """
+    with np.load(path) as data:
+        return (schedule_from_records(data["instances"], G, M),
+                edge_schedule_from_records(data["transfers"], G, M, E_cls))
+
+def save_parquet(path, S, E = None):
+    """
+
+    Save a schedule as a directory with instances.parquet and transfers.parquet
+
+    Requires pyarrow.
+
+    Args:
+        path (): directory to write to
+        S (): Schedule
+        E (): EdgeSchedule or NoEdgeSchedule
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    makedirs(path, exist_ok = True)
+    for name, records in [("instances", instance_records(S)), ("transfers", transfer_records(E))]:
+        table = pa.table({field: records[field] for field in records.dtype.names})
+        pq.write_table(table, join(path, f"{name}.parquet"))
+
+def load_parquet(path, G, M, E_cls = schedule.EdgeSchedule):
+    """
+
+    Load a schedule written by save_parquet
+
+    Requires pyarrow.
+
+    Args:
+        path (): directory of the schedule
+        G (): TaskGraph that was scheduled
+        M (): machine model the schedule was made for
+        E_cls (): edge schedule class to rebuild the transfers into
+
+    Returns:
+        (Schedule, edge schedule)
+    """
+    import pyarrow.parquet as pq
+
+    def read(name, dtype):
+        table = pq.read_table(join(path, f"{name}.parquet"))
+        records = np.empty(table.num_rows, dtype=dtype)
+        for field in dtype.names:
+            records[field] = table.column(field).to_numpy()
+        return records
+
+    return (schedule_from_records(read("instances", instance_dtype), G, M),
+            edge_schedule_from_records(read("transfers", transfer_dtype), G, M, E_cls))
+
+def read_csv(file, dtype, parse):
+    """ Parse a CSV file with a header row into a structured array, line by line """
+    def rows(f):
+        next(f)
+        for line in f:
+            if line.strip():
+                yield parse(line.rstrip("\n").split(","))
+
+    if isinstance(file, str):
+        with open(file) as f:
+            return np.fromiter(rows(f), dtype=dtype)
+    return np.fromiter(rows(file), dtype=dtype)
+
+def load_csv(instances_file, G, M, transfers_file = None, E_cls = schedule.EdgeSchedule):
+    """
+
+    Load a schedule written by Schedule.to_csv and EdgeSchedule.to_csv
+
+    Args:
+        instances_file (): file name or handle of the instances
+        G (): TaskGraph that was scheduled
+        M (): machine model the schedule was made for
+        transfers_file (): file name or handle of the transfers, if any
+        E_cls (): edge schedule class to rebuild the transfers into
+
+    Returns:
+        (Schedule, edge schedule)
+    """
+    # config,pe,location,t_s,t_f,task
+    instances = read_csv(instances_file, instance_dtype,
+                         lambda r: (int(r[0]), int(r[1]), int(r[2]), float(r[3]), float(r[4]), int(r[5])))
+
+    transfers = np.empty(0, dtype=transfer_dtype)
+    if transfers_file is not None:
+        # t_s,t_f,link,from,to with the link written as source-target
+        transfers = read_csv(transfers_file, transfer_dtype,
+                             lambda r: (float(r[0]), float(r[1]), *map(int, r[2].split("-")), int(r[3]), int(r[4])))
+
+    return (schedule_from_records(instances, G, M),
+            edge_schedule_from_records(transfers, G, M, E_cls))
@@ -1,4 +1,6 @@
 class Task:
+    __slots__ = ("index", "label", "cost", "type")
+
     def __init__(self, index, label, cost, ttype = None):
         self.index = index
         self.label = label
@@ -6,6 +8,8 @@ class Task:
         self.type = ttype
 
 class ScheduledTask(Task):
+    __slots__ = ("t_s", "t_f", "pe", "location", "instance")
+
     def __init__(self, task, instance):
         super().__init__(task.index, task.label, task.cost, ttype = task.type)
         self.t_s = instance.interval.lower
@@ -13,4 +17,3 @@ class ScheduledTask(Task):
         self.pe = instance.pe
         self.location = instance.location
         self.instance = instance
-
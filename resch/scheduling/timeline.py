@@ -0,0 +1,114 @@
+from bisect import bisect_left, bisect_right
+
+class Timeline:
+    """ Busy intervals [lower, upper) of one resource, sorted by start
+
+        The intervals are disjoint, so the ends are sorted as well and both
+        can be searched with bisect. With merge=True, overlapping or touching
+        intervals are united, e.g. for all instances of one configuration on a
+        location. Otherwise overlapping intervals are rejected with a
+        ValueError.
+    """
+
+    def __init__(self, merge = False):
+        self.merge = merge
+        self.starts = []
+        self.ends = []
+        self.values = []
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts, self.ends, self.values)
+
+    def upper(self):
+        """ End of the last interval or 0 if there is none """
+        return self.ends[-1] if self.ends else 0
+
+    def overlaps(self, lower, upper):
+        i = bisect_right(self.ends, lower)
+        return i < len(self.starts) and self.starts[i] < upper
+
+    def add(self, lower, upper, value = None):
+        """
+        Occupy [lower, upper)
+
+        Returns:
+            Record for restore() to undo the change, None if nothing changed
+        """
+        if lower == upper:
+            return None
+
+        if self.merge:
+            # All intervals that overlap or touch [lower, upper]
+            i = bisect_left(self.ends, lower)
+            j = bisect_right(self.starts, upper)
+        else:
+            if self.overlaps(lower, upper):
+                raise ValueError(f"{self} and [{lower},{upper}) overlap")
+            i = j = bisect_left(self.starts, lower)
+
+        record = (i, self.starts[i:j], self.ends[i:j], self.values[i:j])
+        if i < j:
+            lower = min(lower, self.starts[i])
+            upper = max(upper, self.ends[j - 1])
+        self.starts[i:j] = [lower]
+        self.ends[i:j] = [upper]
+        self.values[i:j] = [value]
+        return record
+
+    def restore(self, record):
+        """ Undo the add() that returned record, later adds have to be undone first """
+        (i, starts, ends, values) = record
+        self.starts[i:i + 1] = starts
+        self.ends[i:i + 1] = ends
+        self.values[i:i + 1] = values
+
+    def conflict(self, start, duration, pad = 0):
+        """
+        First interval that does not leave room for [start, start + duration)
+
+        Every interval is widened by pad on both sides. A task only fits in
+        front of an interval if it ends strictly before it begins.
+
+        Returns:
+            End of the conflicting interval including pad or None
+        """
+        i = bisect_right(self.ends, start - pad)
+        if i < len(self.starts) and self.starts[i] - pad <= start + duration:
+            return self.ends[i] + pad
+        return None
+
+    def earliest(self, start, duration, pad = 0):
+        """ Earliest start >= start with room for duration """
+        return earliest([(self, pad)], start, duration)
+
+    def __str__(self):
+        return " | ".join(f"[{s},{e}) -> {v}" for s, e, v in self) or "()"
+
+    def __repr__(self):
+        return f"Timeline({self})"
+
+def earliest(timelines, start, duration):
+    """
+    Earliest start >= start that fits into a number of timelines at once
+
+    Args:
+        timelines (): list of (Timeline, pad) tuples
+        start (): lower bound for the start
+        duration (): length of the interval to place
+
+    Returns:
+        Start time
+    """
+    moved = True
+    while moved:
+        moved = False
+        for timeline, pad in timelines:
+            end = timeline.conflict(start, duration, pad)
+            while end is not None:
+                start = end
+                moved = True
+                end = timeline.conflict(start, duration, pad)
+    return start
@@ -22,5 +22,21 @@ class TestBenchmark(unittest.TestCase):
 
         self.assertEqual(results.shape, (3, 10))
 
+    def test_machine_benchmark_cache(self):
+        M = fixtures.minimal_machine()
+        Gs = [fixtures.sample_graph(), fixtures.sample_graph()]
+        calls = []
+        def algo(M, G):
+            calls.append(G)
+            return reft.REFT(M, G).schedule()
+
+        cache = {}
+        results = bench.machine_benchmark(M, Gs, [("REFT", algo)], {}, cache = cache)
+
+        # Both graphs are equal, the second run is taken from the cache
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(results[0]["makespan"].item(), results[1]["makespan"].item())
+
 if __name__ == '__main__':
     unittest.main()
@@ -13,6 +13,18 @@ class TestGenerator(unittest.TestCase):
         # Need entry and exit-node
         self.assertEqual(g.num_vertices(), n + 2)
 
+    def test_dummy_tasks(self):
+        n = 10
+        # Without edges, every task is a source and a sink
+        g = generator.erdos(n, 0)
+        self.assertEqual(g.vertex(n).out_degree(), n)
+        self.assertEqual(g.vertex(n + 1).in_degree(), n)
+
+        # A complete DAG only has one source and one sink
+        g = generator.erdos(n, 1)
+        self.assertEqual(g.vertex(n).out_degree(), 1)
+        self.assertEqual(g.vertex(n + 1).in_degree(), 1)
+
     def test_layer_by_layer(self):
         n = 25
         layers = 3
@@ -19,7 +19,7 @@ class TestMetrics(unittest.TestCase):
     def test_slr(self):
         S = fixtures.schedule_with_len(900)
         G = fixtures.sample_graph()
-        self.assertEqual(metrics.slr(S, G), 3)
+        self.assertEqual(metrics.slr(S, G), 1.5)
 
     def test_slack(self):
         S = fixtures.schedule_with_len(800)
@@ -32,7 +32,7 @@ class TestMetrics(unittest.TestCase):
 
     def test_cp_len(self):
         G = fixtures.sample_graph()
-        self.assertEqual(metrics.cp_len(G), 475)
+        self.assertEqual(metrics.cp_len(G), 940)
 
     def test_sequential(self):
         G = fixtures.sample_graph()
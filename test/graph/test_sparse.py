@@ -0,0 +1,39 @@
+import unittest
+
+from test.context import resch
+from resch.graph.sparse import EdgeCosts
+
+class TestEdgeCosts(unittest.TestCase):
+    def test_lookup(self):
+        c = EdgeCosts(4, [0, 0, 2], [2, 1, 3], [5, 3, 7])
+
+        self.assertEqual(c.nnz, 3)
+        self.assertEqual(c[0, 2], 5)
+        self.assertEqual(c[2, 3], 7)
+        self.assertEqual(c[1, 0], 0)
+        self.assertEqual(c.toarray()[0, 1], 3)
+
+    def test_duplicate_edges_keep_last(self):
+        c = EdgeCosts(2, [0, 0], [1, 1], [5, 9])
+
+        self.assertEqual(c.nnz, 1)
+        self.assertEqual(c[0, 1], 9)
+
+    def test_set(self):
+        c = EdgeCosts(3, [0, 1], [1, 2], [1, 1])
+        c[0, 1] = 10
+        self.assertEqual(c[0, 1], 10)
+
+        with self.assertRaises(KeyError):
+            c[0, 2] = 10
+
+    def test_transpose(self):
+        c = EdgeCosts(3, [0, 1], [1, 2], [4, 6])
+        t = c.transpose()
+
+        self.assertEqual(t[1, 0], 4)
+        self.assertEqual(t[2, 1], 6)
+        self.assertEqual(t[0, 1], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import numpy as np
+
+from test.context import resch
+import resch.graph.taskgraph as taskgraph
+import resch.evaluation.generator as generator
+from graph_tool import Graph
+
+from test.fixtures import fixtures
+
+def triangle(shortcut_cost):
+    g = Graph()
+    g.add_vertex(3)
+    g.ep["comm"] = g.new_edge_property("int")
+    for (s, d, cost) in [(0, 1, 0), (1, 2, 0), (0, 2, shortcut_cost)]:
+        g.ep.comm[g.add_edge(s, d)] = cost
+    return taskgraph.TaskGraph(g)
+
+class TestTaskGraph(unittest.TestCase):
+    def test_transitive_reduction(self):
+        G = triangle(0)
+
+        self.assertEqual(G.transitive_reduction(), 1)
+        self.assertEqual(G.num_edges(), 2)
+        self.assertEqual(G.c.nnz, 2)
+
+    def test_transitive_reduction_keeps_comm(self):
+        G = triangle(10)
+
+        self.assertEqual(G.transitive_reduction(), 0)
+        self.assertEqual(G.transitive_reduction(zero_cost_only = False), 1)
+
+    def test_fingerprint(self):
+        G = triangle(10)
+        H = triangle(10)
+        self.assertEqual(G.fingerprint(), H.fingerprint())
+
+        H.set_uniform_comm(5)
+        self.assertNotEqual(G.fingerprint(), H.fingerprint())
+    def assertSameIngestion(self, g):
+        (_, w, c, t) = taskgraph.TaskGraph.from_graph(g)
+        (_, w_iter, c_iter, t_iter) = taskgraph.TaskGraph.from_graph_iter(g)
+
+        np.testing.assert_array_equal(w, w_iter)
+        np.testing.assert_array_equal(t, t_iter)
+        np.testing.assert_array_equal(c.toarray(), c_iter.toarray())
+
+    def test_from_graph(self):
+        self.assertSameIngestion(fixtures.sample_graph().g)
+
+        # Types on every task
+        self.assertSameIngestion(generator.lu(4))
+
+        # Edges filtered by the spanning tree
+        g = generator.random(20)
+        g.vp["type"] = g.new_vertex_property("int")
+        g.vp.type.a = np.arange(g.num_vertices()) % 3 + 1
+        self.assertSameIngestion(g)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+import tempfile
+import numpy as np
+
+from test.context import resch
+import resch.graph.util as util
+
+from test.fixtures import fixtures
+
+class TestBinary(unittest.TestCase):
+    def test_roundtrip(self):
+        G = fixtures.sample_graph()
+        with tempfile.TemporaryDirectory() as path:
+            util.save_binary(G, path)
+            loaded = util.load(path)
+
+            self.assertEqual(loaded.num_nodes(), G.num_nodes())
+            self.assertEqual(loaded.num_edges(), G.num_edges())
+            np.testing.assert_array_equal(loaded.w, G.w)
+            np.testing.assert_array_equal(loaded.c.toarray(), G.c.toarray())
+            self.assertEqual(loaded.task(3).label, G.task(3).label)
+            self.assertEqual(loaded.cp_len(), G.cp_len())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,3 +16,49 @@ class TestModel(unittest.TestCase):
         topo = Topology.default_from_accelerator(acc)
         self.assertEqual(topo.g.num_vertices(), 11) # 2 x 2 locations, 1 x 1 location, 2 x tx, 2 x rx, 2 x loc
         self.assertEqual(topo.g.num_edges(), 16)
+
+    def test_fingerprint(self):
+        M = fixtures.single_config_machine(num_PEs = 2, num_locs = 2)
+        N = fixtures.single_config_machine(num_PEs = 2, num_locs = 2)
+        self.assertEqual(M.fingerprint(), N.fingerprint())
+
+        N.properties[N.PEs()[0]]["t"] = 1
+        self.assertNotEqual(M.fingerprint(), N.fingerprint())
+
+    def test_pe_paths(self):
+        M = fixtures.single_config_machine(num_PEs = 2, num_locs = 2)
+        topo = M.topology
+
+        self.assertEqual(topo.pe_path((0, 0), (0, 0)), ())
+        self.assertEqual(len(topo.pe_path((0, 0), (1, 0))), 4) # rx, location, tx
+        self.assertEqual(len(topo.pe_path((0, 0), (1, 1))), 5) # and the link between the locations
+        self.assertEqual(topo.min_capacity((0, 0), (1, 1)), 1)
+
+        link = topo.pe_path((0, 0), (1, 1))[2]
+        topo.set_capacity(link, 0.5)
+        self.assertEqual(topo.min_capacity((0, 0), (1, 1)), 0.5)
+        self.assertEqual(topo.min_capacity((0, 0), (1, 0)), 1)
+
+    def test_accelerator_index(self):
+        locations = [Location(0), Location(1)]
+        configurations = [Configuration(0, locations), Configuration(1, [locations[1]])]
+        acc = Accelerator([PE(0, configurations[0]), PE(1, configurations[1])])
+
+        self.assertEqual(acc.get_pe(1).index, 1)
+        self.assertEqual(acc.location(1), locations[1])
+        self.assertEqual([c.index for c in acc.configurations()], [0, 1])
+
+        acc.add_pe(PE(2, Configuration(2, [Location(2)])))
+        self.assertEqual(acc.get_pe(2).index, 2)
+        self.assertEqual([l.index for l in acc.locations()], [0, 1, 2])
+
+    def test_placements(self):
+        M = fixtures.single_config_machine(num_PEs = 2, num_locs = 2)
+        M.properties[M.get_pe(0)]["t"] = 1
+
+        self.assertEqual([(p.index, l.index) for (p, l) in M.placements(1)], [(0, 0), (1, 0), (0, 1), (1, 1)])
+        self.assertEqual([(p.index, l.index) for (p, l) in M.placements(2)], [(1, 0), (1, 1)])
+
+        M.properties[M.get_pe(1)]["t"] = 1
+        self.assertEqual(M.placements(2), ())
+        self.assertEqual(list(M.placement_arrays(1).pe), [0, 1, 0, 1])
@@ -0,0 +1,29 @@
+import unittest
+
+from test.context import resch
+import resch.scheduling.lns as lns
+import resch.scheduling.reft as reft
+import resch.graph.taskgraph as graph
+import resch.evaluation.generator as generator
+
+from test.fixtures import fixtures
+
+class TestLNS(unittest.TestCase):
+    def test_lns(self):
+        M = fixtures.pr_machine(num_PEs = 2, num_locs = 2)
+        for l in M.locations():
+            M.properties[l]["r"] = 5
+        G = graph.TaskGraph(generator.random(25))
+        (S_reft, _) = reft.REFT(M, G).schedule()
+
+        scheduler = lns.LNS(M, G, size = 5)
+        (S, E) = scheduler.schedule(time_limit = 10, iterations = 20)
+
+        self.assertEqual(len(S.tasks), G.num_nodes())
+        self.assertEqual(S.violations(G, M, E), [])
+        self.assertLessEqual(S.length(), S_reft.length())
+        self.assertEqual(scheduler.history[0].makespan, S_reft.length())
+        self.assertEqual(scheduler.history[-1].makespan, S.length())
+
+    def test_merged(self):
+        self.assertEqual(lns.merged([(5, 7), (0, 2), (1, 3), (7, 8)]), [(0, 3), (5, 8)])
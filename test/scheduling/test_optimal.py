@@ -1,7 +1,10 @@
 import unittest
+import numpy as np
+from ortools.sat.python import cp_model
 
 from test.context import resch
 import resch.scheduling.optimal as optimal
+import resch.scheduling.reft as reft
 import resch.scheduling.schedule as schedule
 import resch.machine.model as model
 import resch.graph.taskgraph as graph
@@ -44,3 +47,57 @@ class TestOptimal(unittest.TestCase):
         (S, E) = optimal.OptimalScheduler(M, G, schedule.EdgeSchedule).schedule()
 
         self.assertEqual(len(S.tasks), G.num_nodes())
+
+    def test_optimal_progress(self):
+        M = fixtures.single_config_machine(num_PEs = 2, num_locs = 1)
+        G = graph.TaskGraph(generator.random(10))
+        progress = []
+        (S, E) = optimal.OptimalScheduler(M, G).schedule(time_limit = 10, workers = 1, progress = progress.append)
+
+        self.assertEqual(len(S.tasks), G.num_nodes())
+        self.assertGreater(len(progress), 0)
+        self.assertEqual(progress[-1].objective, S.length())
+        for p in progress:
+            self.assertLessEqual(p.bound, p.objective)
+
+    def test_optimal_reconfiguration(self):
+        M = fixtures.r_machine([1, 2], num_locs = 2)
+        for l in M.locations():
+            M.properties[l]["r"] = 20
+        G = graph.TaskGraph(generator.random(6))
+        (S_instances, _) = optimal.OptimalScheduler(M, G, reconfiguration = "instances").schedule()
+        (S_tasks, E) = optimal.OptimalScheduler(M, G, reconfiguration = "tasks").schedule()
+
+        self.assertEqual(S_tasks.violations(G, M, E), [])
+        self.assertEqual(S_tasks.length(), S_instances.length())
+
+    def test_optimal_reft_hint(self):
+        M = fixtures.pr_machine(num_PEs = 2, num_locs = 2)
+        for l in M.locations():
+            M.properties[l]["r"] = 5
+        G = graph.TaskGraph(generator.random(8))
+        (S_reft, _) = reft.REFT(M, G, schedule.EdgeSchedule).schedule()
+        scheduler = optimal.OptimalScheduler(M, G, schedule.EdgeSchedule)
+        (S, E) = scheduler.schedule()
+
+        self.assertEqual(scheduler.status, cp_model.OPTIMAL)
+        self.assertLessEqual(S.length(), S_reft.length())
+
+        # The hinted REFT schedule is a solution within the horizon
+        solver = cp_model.CpSolver()
+        solver.parameters.fix_variables_to_their_hinted_value = True
+        self.assertIn(solver.Solve(scheduler.model), [cp_model.OPTIMAL, cp_model.FEASIBLE])
+
+    def test_optimal_edge_reference(self):
+        M = fixtures.pr_machine(num_PEs = 2, num_locs = 2)
+        for l in M.locations():
+            M.properties[l]["r"] = 5
+        # a -> b, a -> c with a transfer of 3 each
+        G = graph.TaskGraph.from_arrays(np.full((3, 2), 10), [0, 0], [1, 2], [3, 3])
+
+        # a and b on one placement, c on the other location after the transfer,
+        # anything on the same location pays the reconfiguration
+        for reconfiguration in ["tasks", "instances"]:
+            (S, E) = optimal.OptimalScheduler(M, G, schedule.EdgeSchedule, reconfiguration = reconfiguration).schedule()
+            self.assertEqual(S.length(), 23)
+            self.assertEqual(S.violations(G, M, E), [])
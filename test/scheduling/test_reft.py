@@ -36,3 +36,23 @@ class TestREFT(unittest.TestCase):
         (S, E) = reft.REFT(M, G, schedule.EdgeSchedule).schedule()
 
         self.assertEqual(len(S.tasks), G.num_nodes())
+
+    def test_reft_overhead_change(self):
+        M = fixtures.pr_machine(num_PEs = 2, num_locs = 1)
+        G = graph.TaskGraph(generator.random(10))
+        for l in M.locations():
+            M.properties[l]["r"] = 0
+        reft.REFT(M, G).schedule()
+
+        for l in M.locations():
+            M.properties[l]["r"] = 1000
+        (S, E) = reft.REFT(M, G).schedule()
+        self.assertEqual(S.violations(G, M, E), [])
+
+        # A fresh machine with the same overhead gives the same schedule
+        M_fresh = fixtures.pr_machine(num_PEs = 2, num_locs = 1)
+        for l in M_fresh.locations():
+            M_fresh.properties[l]["r"] = 1000
+        (S_fresh, _) = reft.REFT(M_fresh, G).schedule()
+        self.assertEqual(S.length(), S_fresh.length())
+        self.assertEqual([i.placed_pe() for i in S.instances], [i.placed_pe() for i in S_fresh.instances])
@@ -2,8 +2,12 @@ import unittest
 
 from test.context import resch
 import resch.scheduling.schedule as schedule
+import resch.scheduling.task as task_m
+import resch.graph.taskgraph as graph
 from test.fixtures import fixtures
 from io import StringIO
+import portion as po
+import numpy as np
 
 class TestREFT(unittest.TestCase):
     def test_reft(self):
@@ -15,3 +19,79 @@ class TestREFT(unittest.TestCase):
         lines = output.readlines()
 
         self.assertEqual(len(lines), 2)
+
+    def test_lookup(self):
+        S = fixtures.schedule_with_len(500)
+
+        self.assertEqual(S.task(0).t_f, 500)
+        self.assertIsNone(S.task(1))
+        self.assertEqual(S.instances_for_tasks([0, 1]), S.instances)
+
+        arrays = S.arrays()
+        self.assertEqual(list(arrays.task), [0])
+        self.assertEqual(list(arrays.t_f), [500])
+
+    def test_violations(self):
+        M = fixtures.pr_machine(num_PEs = 2, num_locs = 1)
+        M.properties[M.location(0)]["r"] = 10
+        G = graph.TaskGraph.from_arrays(np.full((3, 2), 100), [0], [1], [5])
+        (a, b, c) = (G.task(0), G.task(1), G.task(2))
+        S = schedule.Schedule()
+        E = schedule.EdgeSchedule(G, M)
+        S.add_task(task_m.ScheduledTask(a, schedule.Instance(a, M.get_pe(0), M.location(0), po.closedopen(0, 100))))
+
+        self.assertEqual([v.kind for v in S.violations(G, M, E)], ["missing", "missing"])
+
+        # b starts before a finishes, in another configuration on the same
+        # location and before the data has arrived
+        S.add_task(task_m.ScheduledTask(b, schedule.Instance(b, M.get_pe(1), M.location(0), po.closedopen(95, 195))))
+        E.add_interval(0, po.closedopen(100, 105), a.index, b.index)
+
+        # c runs on the PE of a and its transfer overlaps the one of a on the
+        # link, which is only accepted if the overlaps are kept for the check
+        with self.assertRaises(ValueError):
+            E.add_interval(0, po.closedopen(60, 101), c.index, b.index)
+        S.add_task(task_m.ScheduledTask(c, schedule.Instance(c, M.get_pe(0), M.location(0), po.closedopen(50, 60))), exclusive = False)
+        E.add_interval(0, po.closedopen(60, 101), c.index, b.index, exclusive = False)
+
+        violations = {}
+        for v in S.violations(G, M, E):
+            violations.setdefault(v.kind, []).append(v)
+        self.assertEqual(set(violations), {"precedence", "pe", "reconfiguration", "link", "transfer"})
+        self.assertEqual([(v.first, v.second, v.amount) for v in violations["precedence"]], [(0, 1, 5)])
+        self.assertEqual([(v.first, v.second, v.amount) for v in violations["pe"]], [(0, 2, 50)])
+        self.assertEqual([v.amount for v in violations["reconfiguration"]], [15])
+        self.assertEqual([(v.first, v.second, v.amount) for v in violations["link"]], [((2, 1), (0, 1), 1)])
+        self.assertEqual(sorted((v.first, v.amount) for v in violations["transfer"]), [(0, 10), (2, 6)])
+
+    def test_rollback(self):
+        S = fixtures.schedule_with_len(500)
+        token = S.snapshot()
+
+        second = fixtures.task_with_len(100)
+        second.index = 1
+        second.instance.task = second
+        second.instance.interval = po.closedopen(500, 600)
+        S.add_task(second)
+        self.assertEqual(S.length(), 600)
+
+        S.rollback(token)
+        S.commit(token)
+        self.assertEqual(S.length(), 500)
+        self.assertIsNone(S.task(1))
+        self.assertEqual(len(S.A_p[(0, 0)]), 1)
+
+    def test_edge_rollback(self):
+        M = fixtures.minimal_machine()
+        E = schedule.EdgeSchedule(fixtures.empty_graph(), M)
+        E.add_interval(0, po.closedopen(0, 10), 0, 1)
+        token = E.snapshot()
+
+        E.add_interval(0, po.closedopen(10, 20), 1, 2)
+        E.add_interval(1, po.closedopen(10, 20), 1, 2)
+
+        E.rollback(token)
+        E.commit(token)
+        self.assertEqual(list(E.A_l[0]), [(0, 10, (0, 1))])
+        self.assertEqual(len(E.A_l[1]), 0)
+        self.assertIsNone(E.journal)
@@ -0,0 +1,52 @@
+import unittest
+import tempfile
+import numpy as np
+from io import StringIO
+from os.path import join
+
+from test.context import resch
+import resch.scheduling.reft as reft
+import resch.scheduling.schedule as schedule
+import resch.scheduling.storage as storage
+
+from test.fixtures import fixtures
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.M = fixtures.single_config_machine(num_PEs = 2, num_locs = 2)
+        self.G = fixtures.sample_graph()
+        (self.S, self.E) = reft.REFT(self.M, self.G, schedule.EdgeSchedule).schedule()
+
+    def assertSameSchedule(self, S, E):
+        np.testing.assert_array_equal(storage.instance_records(S), storage.instance_records(self.S))
+        np.testing.assert_array_equal(storage.transfer_records(E), storage.transfer_records(self.E))
+        self.assertEqual(S.length(), self.S.length())
+
+    def test_npz(self):
+        with tempfile.TemporaryDirectory() as d:
+            storage.save_npz(join(d, "schedule.npz"), self.S, self.E)
+            self.assertSameSchedule(*storage.load_npz(join(d, "schedule.npz"), self.G, self.M))
+
+    def test_csv(self):
+        instances = StringIO()
+        transfers = StringIO()
+        self.S.to_csv(instances, chunk_size = 3)
+        self.E.to_csv(transfers)
+        instances.seek(0)
+        transfers.seek(0)
+
+        self.assertSameSchedule(*storage.load_csv(instances, self.G, self.M, transfers))
+    def test_overlap(self):
+        records = storage.instance_records(self.S)
+        (f, t) = np.flatnonzero(records["t_s"] != records["t_f"])[:2]
+        for field in ["config", "pe", "location", "t_s", "t_f"]:
+            records[t][field] = records[f][field]
+
+        # Loading keeps the overlap for violations() instead of raising
+        S = storage.schedule_from_records(records, self.G, self.M)
+        self.assertEqual(len(S.instances), len(records))
+        overlaps = [v for v in S.violations(self.G, self.M) if v.kind == "pe"]
+        self.assertEqual([(v.first, v.second) for v in overlaps], [tuple(sorted((int(records[f]["task"]), int(records[t]["task"]))))])
+
+if __name__ == '__main__':
+    unittest.main()
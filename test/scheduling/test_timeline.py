@@ -0,0 +1,44 @@
+import unittest
+
+from test.context import resch
+from resch.scheduling.timeline import Timeline, earliest
+
+class TestTimeline(unittest.TestCase):
+    def test_earliest(self):
+        T = Timeline()
+        T.add(0, 10, 0)
+        T.add(15, 20, 1)
+
+        self.assertEqual(T.earliest(0, 4), 10)
+        self.assertEqual(T.earliest(0, 5), 20) # has to end before 15
+        self.assertEqual(T.earliest(12, 2), 12)
+        self.assertEqual(T.earliest(0, 1, pad = 3), 23)
+
+    def test_merge(self):
+        T = Timeline(merge = True)
+        T.add(0, 5)
+        T.add(10, 15)
+        T.add(5, 10)
+        T.add(20, 25)
+
+        self.assertEqual(list(zip(T.starts, T.ends)), [(0, 15), (20, 25)])
+
+    def test_overlap(self):
+        T = Timeline()
+        T.add(0, 5)
+
+        self.assertTrue(T.overlaps(4, 6))
+        self.assertFalse(T.overlaps(5, 6))
+        with self.assertRaises(ValueError):
+            T.add(2, 3)
+
+    def test_multiple_timelines(self):
+        pe = Timeline()
+        pe.add(0, 10)
+        location = Timeline(merge = True)
+        location.add(12, 14)
+
+        self.assertEqual(earliest([(pe, 0), (location, 2)], 0, 3), 16)
+
+if __name__ == '__main__':
+    unittest.main()